@@ -3,22 +3,37 @@
 
 # This simple script creates or updates labels in the 3D view, based on sensor's Label2
 
+import os
+import sys
 import FreeCAD as App
+
+try:
+    scripts_dir = os.path.dirname(os.path.abspath(__file__))
+    if scripts_dir not in sys.path:
+        sys.path.append(scripts_dir)
+except NameError: # pasted into the Python console, freecad-scripts directory has to be in sys.path already
+    pass
+import doc_index
+import instrumentation as ins
+
 sensor_label = 'sensor'
 
+@ins.traced()
 def aul():
     doc = App.ActiveDocument
     labels = []
-    sensors = doc.findObjects(Label=sensor_label)
+    with ins.span('lookup'):
+        sensors = doc_index.get_index(doc).find_objects(sensor_label)
     for idx,s in enumerate(sensors):
-        if not doc.getObject('chlabel'+str(idx)):
-            doc.addObject("App::AnnotationLabel", 'chlabel'+str(idx))
+        with ins.span('label', sensor=idx):
+            if not doc.getObject('chlabel'+str(idx)):
+                doc.addObject("App::AnnotationLabel", 'chlabel'+str(idx))
 
-        label = doc.getObject('chlabel'+str(idx))
-        label.ViewObject.BackgroundColor = (1.00,0.00,0.00)
-        label.LabelText = 'ch' + s.Label2
-        label.setExpression('BasePosition', u'<<' + s.Label + '>>.LinkPlacement.Base')
-        labels.append(label)
+            label = doc.getObject('chlabel'+str(idx))
+            label.ViewObject.BackgroundColor = (1.00,0.00,0.00)
+            label.LabelText = 'ch' + s.Label2
+            label.setExpression('BasePosition', u'<<' + s.Label + '>>.LinkPlacement.Base')
+            labels.append(label)
 
     if not doc.getObject('LGroup'):
         doc.addObject("App::DocumentObjectGroup","LGroup")
@@ -26,7 +41,9 @@ def aul():
     gr = doc.getObject('LGroup')
     gr.Label="Label Group"
     gr.addObjects(labels)
-    doc.recompute()
+    with ins.span('recompute'):
+        doc.recompute()
+    ins.count('recomputes')
 
 if __name__ == '__main__':
     aul()
@@ -0,0 +1,111 @@
+# SPDX-License-Identifier: Apache-2.0
+# Copyright (c) 2023 Adrian Przekwas <adrian.v.przekwas@gmail.com>
+
+# Boolean cut of a shape by many tools in a separate FreeCADCmd process, so the FreeCAD GUI stays responsive.
+# Base shape and a compound of placed tools are written as BREP files into a temporary directory, the worker reads them,
+# cuts and writes the result (BREP) and a small JSON report. The master polls done() and reads result(), cancel() kills the worker.
+# Used by place_cut_sensors_progressive() in sensor-builder.py.
+
+import os
+import sys
+import json
+import time
+import shutil
+import tempfile
+import subprocess
+
+scripts_dir = os.path.dirname(os.path.abspath(__file__))
+if scripts_dir not in sys.path:
+    sys.path.append(scripts_dir)
+
+import tracker_batch
+
+# FreeCADCmd from PATH or FREECADCMD, then the one next to the running FreeCAD
+def find_freecadcmd():
+    cmd = tracker_batch.find_freecadcmd()
+    if cmd:
+        return cmd
+    try:
+        import FreeCAD as App
+        bin_dir = os.path.join(App.getHomePath(), 'bin')
+    except ImportError:
+        return None
+    for name in ('FreeCADCmd', 'freecadcmd', 'FreeCADCmd.exe'):
+        path = os.path.join(bin_dir, name)
+        if os.path.isfile(path):
+            return path
+    return None
+
+# placements are kept with the job (name: App.Placement), the caller compares them to detect a stale result
+class CutJob:
+    def __init__(self, base_shape, tools, placements = None, freecadcmd = None):
+        import Part
+        self.placements = dict(placements or {})
+        freecadcmd = freecadcmd or find_freecadcmd()
+        if not freecadcmd:
+            raise RuntimeError('FreeCADCmd not found, set FREECADCMD environment variable')
+        self.dir = tempfile.mkdtemp(prefix='periscope-cut-')
+        self.job = {
+            'base': os.path.join(self.dir, 'base.brep'),
+            'tools': os.path.join(self.dir, 'tools.brep'),
+            'result': os.path.join(self.dir, 'result.brep'),
+            'report': os.path.join(self.dir, 'report.json'),
+        }
+        base_shape.exportBrep(self.job['base'])
+        Part.makeCompound(tools).exportBrep(self.job['tools'])
+        env = dict(os.environ)
+        env[tracker_batch.job_env] = json.dumps(self.job)
+        self.log = open(os.path.join(self.dir, 'worker.log'), 'w')
+        self.t_start = time.perf_counter()
+        self.proc = subprocess.Popen([freecadcmd, os.path.abspath(__file__)], env=env, stdout=self.log, stderr=subprocess.STDOUT)
+
+    def done(self):
+        return self.proc.poll() is not None
+
+    def elapsed(self):
+        return time.perf_counter() - self.t_start
+
+    # worker report, status is 'ok' or 'error' (with 'error' and 'traceback')
+    def report(self):
+        try:
+            with open(self.job['report']) as infile:
+                return json.load(infile)
+        except (OSError, ValueError):
+            return {'status': 'error', 'error': 'worker exited with code ' + str(self.proc.returncode) + ' without a report'}
+
+    # cut shape, None if the worker failed
+    def result(self):
+        import Part
+        if self.report()['status'] != 'ok':
+            return None
+        shape = Part.Shape()
+        shape.importBrep(self.job['result'])
+        return shape
+
+    def cancel(self):
+        if not self.done():
+            self.proc.kill()
+            self.proc.wait()
+        self.cleanup()
+
+    def cleanup(self):
+        self.log.close()
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+# runs inside FreeCADCmd
+def run_cut(job):
+    import Part
+    t0 = time.perf_counter()
+    base = Part.Shape()
+    base.importBrep(job['base'])
+    tools_compound = Part.Shape()
+    tools_compound.importBrep(job['tools'])
+    tools = tools_compound.childShapes()
+    cut_shape = base.cut(tools) if tools else base
+    tmp_path = job['result'] + '.tmp'
+    cut_shape.exportBrep(tmp_path)
+    os.replace(tmp_path, job['result'])
+    return {'status': 'ok', 'tools': len(tools), 'time': time.perf_counter() - t0}
+
+if __name__ == '__main__':
+    tracker_batch.worker_main(run_cut)
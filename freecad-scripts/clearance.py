@@ -0,0 +1,116 @@
+# SPDX-License-Identifier: Apache-2.0
+# Copyright (c) 2023 Adrian Przekwas <adrian.v.przekwas@gmail.com>
+
+# Clearance checks of placed sensors: gaps between sensor PCBs, between sensors and the mainboard,
+# and wall thickness left under stamp cuts.
+# Candidate pairs come from a spatial hash of bounding boxes enlarged by the minimum gap (broad phase),
+# exact distToShape() runs only on pairs whose boxes overlap, so the check is close to linear in the number of sensors.
+# Wall thickness is measured along -normal of every s_lcs: the probe line is intersected only with faces of the cut shape
+# whose bounding boxes it crosses, not with the whole shape (no boolean operation per sensor).
+# In FreeCAD, use check_clearance() from sensor-builder.py, it also runs after place_cut_sensors() and recut_sensors().
+
+import numpy as np
+
+min_gap = 0.5 # mm, between sensors and between sensors and the mainboard
+min_wall = 0.8 # mm, material left under a stamp cut
+wall_probe = 20.0 # mm, wall thickness is searched up to this depth
+
+# (N, 6) array of xmin, ymin, zmin, xmax, ymax, zmax
+def shape_boxes(shapes):
+    boxes = np.zeros((len(shapes), 6))
+    for idx, shape in enumerate(shapes):
+        bb = shape.BoundBox
+        boxes[idx] = (bb.XMin, bb.YMin, bb.ZMin, bb.XMax, bb.YMax, bb.ZMax)
+    return boxes
+
+# pairs (i < j) of boxes closer than margin, boxes are hashed into a grid of cells as large as the median box
+# (the mainboard box is much larger than sensors, it spans several cells instead of making one cell hold everything)
+def broad_phase(boxes, margin = 0.0):
+    boxes = np.asarray(boxes, dtype=float).reshape(-1, 6)
+    if len(boxes) < 2:
+        return []
+    lo = boxes[:, :3] - margin / 2.0
+    hi = boxes[:, 3:] + margin / 2.0
+    cell = max(float(np.median(np.max(hi - lo, axis=1))), 1e-9)
+    cell_lo = np.floor(lo / cell).astype(np.int64)
+    cell_hi = np.floor(hi / cell).astype(np.int64)
+    grid = {}
+    for idx in range(len(boxes)):
+        for key in np.ndindex(*(cell_hi[idx] - cell_lo[idx] + 1)):
+            grid.setdefault(tuple(cell_lo[idx] + key), []).append(idx)
+    pairs = set()
+    for members in grid.values():
+        for a_pos, a in enumerate(members):
+            for b in members[a_pos + 1:]:
+                pairs.add((min(a, b), max(a, b)))
+    pairs = sorted(pairs)
+    if not pairs:
+        return []
+    a, b = np.array(pairs).T
+    overlap = np.all((lo[a] <= hi[b]) & (lo[b] <= hi[a]), axis=1)
+    return [pair for pair, keep in zip(pairs, overlap) if keep]
+
+# items are (name, shape, kind), pairs of kinds listed in checked are tested, eg. [('sensor', 'sensor'), ('sensor', 'mainboard')]
+# returns violations: dicts with names, distance and the closest points
+def check_gaps(items, gap = min_gap, checked = (('sensor', 'sensor'), ('sensor', 'mainboard'))):
+    checked = set(checked) | set((b, a) for a, b in checked)
+    boxes = shape_boxes([shape for _, shape, _ in items])
+    candidates = broad_phase(boxes, gap)
+    violations = []
+    exact = 0
+    for a, b in candidates:
+        name_a, shape_a, kind_a = items[a]
+        name_b, shape_b, kind_b = items[b]
+        if (kind_a, kind_b) not in checked:
+            continue
+        exact += 1
+        distance, points, _ = shape_a.distToShape(shape_b)
+        if distance < gap:
+            violations.append({'type': 'gap', 'a': name_a, 'b': name_b, 'distance': distance,
+                               'points': (points[0][0], points[0][1]) if points else None})
+    return violations, len(candidates), exact
+
+# thickness of material along -normal under every point, points and normals are App.Vector
+# face_index is (faces, bounds (N, 6)) of the cut shape (eg. build_face_index() of sensor-builder.py), built from cut_shape.Faces if not given
+def wall_thicknesses(cut_shape, points, normals, probe = wall_probe, face_index = None):
+    import Part
+    if face_index is None:
+        faces = cut_shape.Faces
+        bounds = shape_boxes(faces)
+    else:
+        faces, bounds = face_index
+    thicknesses = []
+    for point, normal in zip(points, normals):
+        start = point + normal * 0.01
+        end = point - normal * probe
+        seg_lo = np.minimum(tuple(start), tuple(end))
+        seg_hi = np.maximum(tuple(start), tuple(end))
+        near = np.nonzero(np.all((bounds[:, :3] <= seg_hi) & (seg_lo <= bounds[:, 3:]), axis=1))[0]
+        if not len(near):
+            thicknesses.append(0.0) # cut through the whole wall
+            continue
+        hits = Part.makeLine(start, end).section(Part.makeCompound([faces[idx] for idx in near]))
+        depths = sorted(set(round((point - v.Point).dot(normal), 6) for v in hits.Vertexes))
+        if not depths:
+            thicknesses.append(0.0)
+        elif len(depths) == 1: # no exit within the probe
+            thicknesses.append(probe)
+        else:
+            thicknesses.append(depths[1] - depths[0])
+    return thicknesses
+
+def check_walls(cut_shape, names, points, normals, wall = min_wall, probe = wall_probe, face_index = None):
+    violations = []
+    for name, point, thickness in zip(names, points, wall_thicknesses(cut_shape, points, normals, probe, face_index)):
+        if thickness < wall:
+            violations.append({'type': 'wall', 'a': name, 'b': None, 'distance': thickness, 'points': (point, point)})
+    return violations
+
+def print_violations(violations):
+    if not violations:
+        print ('Clearance: no violations')
+    for v in violations:
+        if v['type'] == 'gap':
+            print ('Clearance: ' + v['a'] + ' - ' + v['b'] + ' gap ' + str(round(v['distance'], 3)) + ' mm')
+        else:
+            print ('Clearance: ' + v['a'] + ' wall ' + str(round(v['distance'], 3)) + ' mm')
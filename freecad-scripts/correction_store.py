@@ -0,0 +1,98 @@
+# SPDX-License-Identifier: Apache-2.0
+# Copyright (c) 2023 Adrian Przekwas <adrian.v.przekwas@gmail.com>
+
+# Storage of sensor placement corrections (difference between a sensor and its s_lcs) in the document.
+# All correction sets live in one "SensorCorrections" object: for every set a list of sensor object names (Keys_<set>)
+# and a flat float list with 7 values per sensor (Corr_<set>): rotation quaternion x, y, z, w and translation x, y, z.
+# A set is written and read with a single property assignment, corrections are matched to sensors by object name,
+# so adding, removing or reordering sensors doesn't shift them. FormatVersion allows changing the layout later.
+# In FreeCAD, use save_corr() and load_corr() from sensor-builder.py.
+
+import re
+import numpy as np
+
+store_name = 'SensorCorrections'
+default_set = 'default'
+format_version = 1
+record_fields = 7 # qx, qy, qz, qw, tx, ty, tz
+prop_group = 'Corrections'
+
+def prop_suffix(set_name):
+    return re.sub(r'\W', '_', set_name)
+
+def keys_property(set_name):
+    return 'Keys_' + prop_suffix(set_name)
+
+def values_property(set_name):
+    return 'Corr_' + prop_suffix(set_name)
+
+# quaternions (N, 4) and translations (N, 3) into a flat list
+def pack(quats, translations):
+    quats = np.asarray(quats, dtype=float).reshape(-1, 4)
+    translations = np.asarray(translations, dtype=float).reshape(-1, 3)
+    return np.hstack((quats, translations)).ravel().tolist()
+
+def unpack(values):
+    records = np.asarray(values, dtype=float).reshape(-1, record_fields)
+    return records[:, :4], records[:, 4:]
+
+def get_store(doc, create = False):
+    store = doc.getObject(store_name)
+    if store is None and create:
+        store = doc.addObject('App::FeaturePython', store_name)
+        store.Label = 'Sensor corrections'
+        store.addProperty('App::PropertyInteger', 'FormatVersion', prop_group, 'Layout of correction lists')
+        store.addProperty('App::PropertyStringList', 'SetNames', prop_group, 'Names of correction sets')
+        store.FormatVersion = format_version
+    if store is not None and store.FormatVersion > format_version:
+        raise RuntimeError('Correction store format ' + str(store.FormatVersion) + ' is newer than supported ' + str(format_version))
+    return store
+
+def set_names(doc):
+    store = get_store(doc)
+    return list(store.SetNames) if store else []
+
+def has_set(doc, set_name):
+    return set_name in set_names(doc)
+
+# placements is a dict {sensor name: App.Placement}, replaces the whole set
+def write_set(doc, set_name, placements):
+    store = get_store(doc, True)
+    if any(name != set_name and prop_suffix(name) == prop_suffix(set_name) for name in store.SetNames):
+        raise ValueError('Correction set name ' + set_name + ' clashes with an existing set')
+    keys_prop = keys_property(set_name)
+    values_prop = values_property(set_name)
+    if keys_prop not in store.PropertiesList:
+        store.addProperty('App::PropertyStringList', keys_prop, prop_group, 'Sensor names of set ' + set_name)
+        store.addProperty('App::PropertyFloatList', values_prop, prop_group, 'Corrections of set ' + set_name)
+    keys = list(placements)
+    quats = [placements[key].Rotation.Q for key in keys]
+    translations = [tuple(placements[key].Base) for key in keys]
+    setattr(store, keys_prop, keys)
+    setattr(store, values_prop, pack(quats, translations))
+    if set_name not in store.SetNames:
+        store.SetNames = list(store.SetNames) + [set_name]
+
+# {sensor name: App.Placement}, None if there is no such set
+def read_set(doc, set_name):
+    import FreeCAD as App
+    store = get_store(doc)
+    if store is None or set_name not in store.SetNames:
+        return None
+    keys = getattr(store, keys_property(set_name))
+    quats, translations = unpack(getattr(store, values_property(set_name)))
+    return {key: App.Placement(App.Vector(*t.tolist()), App.Rotation(*q.tolist())) for key, q, t in zip(keys, quats, translations)}
+
+# replaces corrections of some sensors only, the others are kept
+def update_set(doc, set_name, placements):
+    current = read_set(doc, set_name) or {}
+    current.update(placements)
+    write_set(doc, set_name, current)
+
+def remove_set(doc, set_name):
+    store = get_store(doc)
+    if store is None or set_name not in store.SetNames:
+        return
+    store.removeProperty(keys_property(set_name))
+    store.removeProperty(values_property(set_name))
+    store.SetNames = [name for name in store.SetNames if name != set_name]
@@ -0,0 +1,202 @@
+# SPDX-License-Identifier: Apache-2.0
+# Copyright (c) 2023 Adrian Przekwas <adrian.v.przekwas@gmail.com>
+
+# Sensor visibility coverage of a tracker, without running the SteamVR HDK simulation.
+# For a dense set of directions on a sphere (a base station far away in that direction), counts sensors that
+# are inside their field of view and not occluded by the tracker body itself.
+# Occlusion is tested with batched ray-triangle intersection over a bounding volume hierarchy (BVH) of the mesh,
+# all rays are traversed together with NumPy.
+# Sensor points and normals come from the tracker JSON (modelPoints in meters, modelNormals),
+# the mesh from the exported .scad model (in mm).
+#
+# Usage: python3 coverage.py tracker.json tracker.scad [--directions 20000] [--fov 120] [--min-visible 5]
+
+import sys
+import json
+import time
+import argparse
+import numpy as np
+
+import scad_mesh
+import tracker_config
+
+leaf_size = 4
+ray_chunk = 1 << 15 # rays traversed together, limits memory used by (ray, node) pairs
+origin_offset = 0.05 # mm, ray origins are moved along sensor normals so they don't hit the surface they are on
+t_epsilon = 1e-6
+
+# roughly uniform directions on a unit sphere (Fibonacci lattice)
+def sphere_directions(n):
+    i = np.arange(n) + 0.5
+    z = 1.0 - 2.0 * i / n
+    r = np.sqrt(np.maximum(0.0, 1.0 - z * z))
+    phi = np.pi * (3.0 - np.sqrt(5.0)) * i
+    return np.stack([r * np.cos(phi), r * np.sin(phi), z], axis=1)
+
+# flat BVH arrays: node boxes, children (-1 for leaves), ranges of leaf triangles (v0, e1, e2 are stored in BVH order)
+def build_bvh(vertices, faces):
+    tris = np.asarray(vertices, dtype=float)[np.asarray(faces)]
+    tri_min = tris.min(axis=1)
+    tri_max = tris.max(axis=1)
+    centers = tris.mean(axis=1)
+    order = np.arange(len(tris))
+    node_min, node_max, left, right, start, count = [], [], [], [], [], []
+    stack = [(0, len(tris), -1, 0)] # range in order, parent, 0 - left or 1 - right child
+    while stack:
+        lo, hi, parent, side = stack.pop()
+        idx = order[lo:hi]
+        node = len(node_min)
+        node_min.append(tri_min[idx].min(axis=0))
+        node_max.append(tri_max[idx].max(axis=0))
+        left.append(-1)
+        right.append(-1)
+        start.append(lo)
+        count.append(hi - lo)
+        if parent >= 0:
+            (left if side == 0 else right)[parent] = node
+        if hi - lo > leaf_size:
+            c = centers[idx]
+            axis = np.argmax(c.max(axis=0) - c.min(axis=0))
+            mid = (hi - lo) // 2
+            order[lo:hi] = idx[np.argpartition(c[:, axis], mid)]
+            count[node] = 0
+            stack.append((lo + mid, hi, node, 1))
+            stack.append((lo, lo + mid, node, 0))
+    return {
+        'min': np.array(node_min), 'max': np.array(node_max),
+        'left': np.array(left), 'right': np.array(right),
+        'start': np.array(start), 'count': np.array(count),
+        'v0': tris[order, 0], 'e1': tris[order, 1] - tris[order, 0], 'e2': tris[order, 2] - tris[order, 0],
+    }
+
+# Moller-Trumbore test for (ray, triangle) pairs, returns True where the ray hits the triangle in front of its origin
+def ray_triangle_hits(origins, dirs, v0, e1, e2):
+    p = np.cross(dirs, e2)
+    det = np.einsum('ij,ij->i', e1, p)
+    valid = np.abs(det) > 1e-12
+    inv_det = np.where(valid, 1.0 / np.where(valid, det, 1.0), 0.0)
+    s = origins - v0
+    u = np.einsum('ij,ij->i', s, p) * inv_det
+    q = np.cross(s, e1)
+    v = np.einsum('ij,ij->i', dirs, q) * inv_det
+    t = np.einsum('ij,ij->i', e2, q) * inv_det
+    return valid & (u >= 0.0) & (v >= 0.0) & (u + v <= 1.0) & (t > t_epsilon)
+
+def occluded_chunk(bvh, origins, dirs):
+    n = len(origins)
+    hit = np.zeros(n, dtype=bool)
+    safe_dirs = np.where(np.abs(dirs) < 1e-15, 1e-15, dirs)
+    inv_dirs = 1.0 / safe_dirs
+    ray_ids = np.arange(n)
+    node_ids = np.zeros(n, dtype=np.int64)
+    while len(ray_ids):
+        o = origins[ray_ids]
+        inv = inv_dirs[ray_ids]
+        t0 = (bvh['min'][node_ids] - o) * inv
+        t1 = (bvh['max'][node_ids] - o) * inv
+        t_near = np.maximum(np.minimum(t0, t1).max(axis=1), 0.0)
+        t_far = np.maximum(t0, t1).min(axis=1)
+        keep = (t_far >= t_near) & ~hit[ray_ids]
+        ray_ids = ray_ids[keep]
+        node_ids = node_ids[keep]
+
+        counts = bvh['count'][node_ids]
+        leaf = counts > 0
+        leaf_rays = ray_ids[leaf]
+        if len(leaf_rays):
+            leaf_counts = counts[leaf]
+            pair_rays = np.repeat(leaf_rays, leaf_counts)
+            first = np.repeat(np.cumsum(leaf_counts) - leaf_counts, leaf_counts)
+            pair_tris = np.repeat(bvh['start'][node_ids[leaf]], leaf_counts) + np.arange(len(pair_rays)) - first
+            hits = ray_triangle_hits(origins[pair_rays], dirs[pair_rays], bvh['v0'][pair_tris], bvh['e1'][pair_tris], bvh['e2'][pair_tris])
+            hit[pair_rays[hits]] = True
+
+        inner_rays = ray_ids[~leaf]
+        inner_nodes = node_ids[~leaf]
+        ray_ids = np.concatenate([inner_rays, inner_rays])
+        node_ids = np.concatenate([bvh['left'][inner_nodes], bvh['right'][inner_nodes]])
+    return hit
+
+# True for rays (origin + t * dir, t > 0) hitting any mesh triangle
+def occluded(bvh, origins, dirs):
+    hit = np.zeros(len(origins), dtype=bool)
+    for lo in range(0, len(origins), ray_chunk):
+        hit[lo:lo + ray_chunk] = occluded_chunk(bvh, origins[lo:lo + ray_chunk], dirs[lo:lo + ray_chunk])
+    return hit
+
+# returns (D, S) visibility of S sensors from D directions, points in mm
+# fov is the full sensor field of view angle in degrees, bvh=None skips occlusion tests
+def sensor_visibility(points, normals, directions, fov = 120.0, bvh = None):
+    points = np.asarray(points, dtype=float)
+    normals = np.asarray(normals, dtype=float)
+    normals = normals / np.linalg.norm(normals, axis=1, keepdims=True)
+    cos_half = np.cos(np.radians(fov / 2.0))
+    visible = directions @ normals.T >= cos_half
+    if bvh is not None:
+        dir_idx, sens_idx = np.nonzero(visible)
+        origins = points[sens_idx] + normals[sens_idx] * origin_offset
+        blocked = occluded(bvh, origins, directions[dir_idx])
+        visible[dir_idx[blocked], sens_idx[blocked]] = False
+    return visible
+
+# coverage summary: per direction counts, worst directions and fraction of the sphere below min_visible sensors
+def analyze_coverage(points, normals, vertices = None, faces = None, n_directions = 20000, fov = 120.0, min_visible = 5, bvh = None, n_worst = 10):
+    directions = sphere_directions(n_directions)
+    if bvh is None and vertices is not None:
+        bvh = build_bvh(vertices, faces)
+    visible = sensor_visibility(points, normals, directions, fov, bvh)
+    counts = visible.sum(axis=1)
+    worst = np.argsort(counts, kind='stable')[:n_worst]
+    return {
+        'directions': directions,
+        'visible': visible,
+        'counts': counts,
+        'min_count': int(counts.min()),
+        'mean_count': float(counts.mean()),
+        'blind_fraction': float(np.mean(counts < min_visible)),
+        'worst_directions': directions[worst],
+        'worst_counts': counts[worst],
+        'per_sensor_fraction': visible.mean(axis=0),
+    }
+
+# sensor points in mm and normals from a tracker config (see tracker_config.py)
+def config_sensors(config):
+    lh = config['lighthouse_config']
+    return np.array(lh['modelPoints'], dtype=float) * 1000.0, np.array(lh['modelNormals'], dtype=float)
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description='Sensor visibility coverage of a tracker')
+    parser.add_argument('json', help='tracker JSON configuration')
+    parser.add_argument('scad', nargs='?', help='tracker mesh exported as .scad, without it occlusion is not tested')
+    parser.add_argument('--directions', type=int, default=20000, help='number of directions on the sphere')
+    parser.add_argument('--fov', type=float, default=120.0, help='sensor field of view, in degrees')
+    parser.add_argument('--min-visible', type=int, default=5, help='directions with fewer visible sensors are blind spots')
+    parser.add_argument('--out', help='save per direction counts to .json file')
+    args = parser.parse_args(argv)
+
+    points, normals = config_sensors(tracker_config.load_config(args.json))
+    t0 = time.perf_counter()
+    bvh = None
+    if args.scad:
+        vertices, faces = scad_mesh.load_scad_polyhedron(args.scad)
+        bvh = build_bvh(vertices, faces)
+    t1 = time.perf_counter()
+    result = analyze_coverage(points, normals, n_directions=args.directions, fov=args.fov, min_visible=args.min_visible, bvh=bvh)
+    t2 = time.perf_counter()
+
+    print('Sensors: ' + str(len(points)) + ', directions: ' + str(args.directions) + ', BVH: ' + str(round(t1 - t0, 3)) + ' s, visibility: ' + str(round(t2 - t1, 3)) + ' s')
+    print('Visible sensors: min ' + str(result['min_count']) + ', mean ' + str(round(result['mean_count'], 2)))
+    print('Directions with fewer than ' + str(args.min_visible) + ' sensors: ' + str(round(100.0 * result['blind_fraction'], 2)) + ' %')
+    print('Worst directions:')
+    for direction, count in zip(result['worst_directions'], result['worst_counts']):
+        print('  ' + str(np.round(direction, 3).tolist()) + ': ' + str(int(count)))
+    print('Sensor visibility (fraction of directions):')
+    for idx, fraction in enumerate(result['per_sensor_fraction']):
+        print('  ' + str(idx) + ': ' + str(round(float(fraction), 3)))
+    if args.out:
+        with open(args.out, 'w') as outfile:
+            json.dump({'directions': result['directions'].tolist(), 'counts': result['counts'].tolist()}, outfile)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,126 @@
+# SPDX-License-Identifier: Apache-2.0
+# Copyright (c) 2023 Adrian Przekwas <adrian.v.przekwas@gmail.com>
+
+# Shared lookup index for builder, extraction and label scripts.
+# Replaces repeated doc.getObjectsByLabel() / doc.findObjects(Label=...) scans and LCS-Base / LCS-Diode / LCS-IMU
+# searches in linked documents. Entries are dropped by a document observer when objects are created, deleted,
+# relabeled or moved, and after undo/redo, so the next lookup rebuilds them.
+# Usage: index = doc_index.get_index(doc), then index.objects_by_label(label), index.find_objects(pattern),
+# index.linked_placement(link, 'LCS-Base')
+
+import re
+import FreeCAD as App
+import instrumentation as ins
+
+class DocIndex:
+    def __init__(self, doc):
+        self.doc = doc
+        self.by_label = None     # label -> objects in document order
+        self.patterns = {}       # regex pattern -> objects matching it, like findObjects(Label=pattern)
+        self.placements = {}     # (linked document name, LCS label) -> placement
+
+    def drop_labels(self):
+        self.by_label = None
+        self.patterns.clear()
+
+    def drop_placements(self, doc_name, label = None):
+        for key in list(self.placements):
+            if key[0] == doc_name and (label is None or key[1] == label):
+                del self.placements[key]
+
+    def labels(self):
+        if self.by_label is None:
+            ins.count('index_scans')
+            self.by_label = {}
+            for obj in self.doc.Objects:
+                self.by_label.setdefault(obj.Label, []).append(obj)
+        return self.by_label
+
+    # the same as doc.getObjectsByLabel(label)
+    def objects_by_label(self, label):
+        return list(self.labels().get(label, []))
+
+    # the same as doc.findObjects(Label=pattern)
+    def find_objects(self, pattern):
+        if pattern not in self.patterns:
+            ins.count('index_scans')
+            rx = re.compile(pattern)
+            self.patterns[pattern] = [obj for obj in self.doc.Objects if rx.search(obj.Label)]
+        return list(self.patterns[pattern])
+
+    # s_lcs of every sensor (None if missing): the one created for it (sensor object name in its Label2),
+    # in documents from before that by the s_lcs<idx> name if it has no owner, so sensors are all sensors in document order
+    def sensor_lcses(self, sensors):
+        owned = {lcs.Label2: lcs for lcs in self.find_objects('s_lcs') if lcs.Label2}
+        lcses = []
+        for idx, s in enumerate(sensors):
+            lcs = owned.get(s.Name)
+            if lcs is None:
+                lcs = self.doc.getObject('s_lcs' + str(idx))
+                if lcs is not None and lcs.Label2:
+                    lcs = None # created for another sensor
+            lcses.append(lcs)
+        return lcses
+
+    # placement of an object with lcs_label in the document of the object linked by link (eg. LCS-Base of a sensor)
+    def linked_placement(self, link, lcs_label):
+        link_doc = link.getLinkedObject().Document
+        key = (link_doc.Name, lcs_label)
+        if key not in self.placements:
+            ins.count('index_scans')
+            self.placements[key] = link_doc.getObjectsByLabel(lcs_label)[0].Placement
+        return App.Placement(self.placements[key])
+
+class IndexObserver:
+    def slotCreatedObject(self, obj):
+        drop_labels(obj.Document)
+
+    def slotDeletedObject(self, obj):
+        drop_labels(obj.Document)
+        drop_placements(obj.Document)
+
+    def slotChangedObject(self, obj, prop):
+        if prop == 'Label':
+            drop_labels(obj.Document)
+            drop_placements(obj.Document)
+        elif prop == 'Placement':
+            drop_placements(obj.Document, obj.Label)
+
+    def slotUndoDocument(self, doc):
+        drop_labels(doc)
+        drop_placements(doc)
+
+    def slotRedoDocument(self, doc):
+        drop_labels(doc)
+        drop_placements(doc)
+
+    def slotDeletedDocument(self, doc):
+        indexes.pop(doc.Name, None)
+        drop_placements(doc)
+
+indexes = {} # document name -> DocIndex
+observer = None
+
+def drop_labels(doc):
+    index = indexes.get(doc.Name)
+    if index:
+        index.drop_labels()
+
+# placements from a linked document are cached in indexes of documents linking to it
+def drop_placements(doc, label = None):
+    for index in indexes.values():
+        index.drop_placements(doc.Name, label)
+
+def get_index(doc):
+    global observer
+    if observer is None:
+        observer = IndexObserver()
+        App.addDocumentObserver(observer)
+    index = indexes.get(doc.Name)
+    if index is None:
+        index = DocIndex(doc)
+        indexes[doc.Name] = index
+    return index
+
+def clear():
+    indexes.clear()
@@ -0,0 +1,131 @@
+# SPDX-License-Identifier: Apache-2.0
+# Copyright (c) 2023 Adrian Przekwas <adrian.v.przekwas@gmail.com>
+
+# On-disk cache of structures derived from shapes: face bounding boxes used by nearest point lookups,
+# tessellations for optimize_sensors() and simulation meshes (sim_export.py).
+# Entries are keyed by a hash of the shape geometry (BREP without triangulation), so they survive closing FreeCAD
+# and are reused whenever "tracker-base" (or a cut shape) is the same as in an earlier session.
+# Every key is a directory with an entry directory of .npy files per cached structure, loaded lazily as memory maps.
+# An entry is written into a temporary directory and renamed into place, so other processes sharing the cache
+# (tracker_batch.py and tracker_sweep.py workers) never see a partly written entry. Removed or replaced files stay readable
+# through maps that are already open (POSIX). When the cache grows above max_cache_mb, the least recently used keys are removed. The cache lives next to the scad_mesh.py one, PERISCOPE_CACHE moves both.
+
+import os
+import uuid
+import shutil
+import hashlib
+import numpy as np
+
+import scad_mesh
+import instrumentation as ins
+
+enabled = True
+max_cache_mb = 1024
+key_memo = [] # (shape, key) of recently hashed shapes, the BREP is serialized once per shape in a session
+key_memo_size = 16
+
+def default_cache_dir():
+    base = os.environ.get(scad_mesh.cache_env) or os.path.join(os.path.expanduser('~'), '.cache', 'periscope')
+    return os.path.join(base, 'geometry')
+
+def shape_key(shape):
+    for memo_shape, key in key_memo:
+        if memo_shape.isSame(shape):
+            return key
+    with ins.span('shape_key'):
+        brep = shape.copy().exportBrepToString() # the copy has no triangulation left by the 3D view
+        key = hashlib.sha256(brep.encode()).hexdigest()
+    key_memo.insert(0, (shape, key))
+    del key_memo[key_memo_size:]
+    return key
+
+# short hash of array values, for entries depending on more than the shape (eg. sensor positions)
+def array_key(arr):
+    return hashlib.sha256(np.ascontiguousarray(arr, dtype=float).tobytes()).hexdigest()[:16]
+
+def entry_dir(key, names, cache_dir = None):
+    entry = hashlib.sha256('\0'.join(names).encode()).hexdigest()[:16]
+    return os.path.join(cache_dir or default_cache_dir(), key, entry)
+
+def load(key, names, cache_dir = None):
+    path = entry_dir(key, names, cache_dir)
+    try:
+        arrays = tuple(np.load(os.path.join(path, name + '.npy'), mmap_mode='r') for name in names)
+        os.utime(os.path.dirname(path)) # marks the key as recently used
+    except (OSError, ValueError, EOFError): # missing, or removed by another process meanwhile
+        return None
+    return arrays
+
+# the entry is complete before it appears under its name, if another process was faster its entry is kept
+def save(key, names, arrays, cache_dir = None):
+    cache_dir = cache_dir or default_cache_dir()
+    path = entry_dir(key, names, cache_dir)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_dir = path + '.tmp-' + uuid.uuid4().hex
+    os.mkdir(tmp_dir)
+    try:
+        for name, arr in zip(names, arrays):
+            np.save(os.path.join(tmp_dir, name + '.npy'), np.asarray(arr))
+        os.rename(tmp_dir, path)
+    except OSError:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        if not os.path.isdir(path):
+            raise
+    evict(cache_dir, keep=key)
+
+# arrays stored under key and names, compute() returns them (tuple in the order of names) when they are not cached yet
+def cached(key, names, compute, cache_dir = None):
+    if not enabled:
+        return compute()
+    arrays = load(key, names, cache_dir)
+    if arrays is not None:
+        ins.count('geometry_cache_hits')
+        return arrays
+    ins.count('geometry_cache_misses')
+    arrays = compute()
+    try:
+        save(key, names, arrays, cache_dir)
+    except OSError as e:
+        print ('Geometry cache not written: ' + str(e))
+    return arrays
+
+def dir_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+# removes least recently used keys until the cache is smaller than max_mb, keep is never removed
+def evict(cache_dir = None, max_mb = None, keep = None):
+    cache_dir = cache_dir or default_cache_dir()
+    max_bytes = (max_cache_mb if max_mb is None else max_mb) * 2**20
+    try:
+        keys = [(os.path.getmtime(os.path.join(cache_dir, key)), key) for key in os.listdir(cache_dir)]
+    except OSError:
+        return
+    sizes = {key: dir_size(os.path.join(cache_dir, key)) for _, key in keys}
+    total = sum(sizes.values())
+    for _, key in sorted(keys):
+        if total <= max_bytes:
+            break
+        if key == keep:
+            continue
+        shutil.rmtree(os.path.join(cache_dir, key), ignore_errors=True)
+        total -= sizes[key]
+
+def clear(cache_dir = None):
+    shutil.rmtree(cache_dir or default_cache_dir(), ignore_errors=True)
+    del key_memo[:]
+
+def print_stats(cache_dir = None):
+    cache_dir = cache_dir or default_cache_dir()
+    try:
+        keys = os.listdir(cache_dir)
+    except OSError:
+        keys = []
+    size = sum(dir_size(os.path.join(cache_dir, key)) for key in keys)
+    print ('Geometry cache ' + cache_dir + ': ' + str(len(keys)) + ' shapes, ' + str(round(size / 2**20, 1)) + ' of ' + str(max_cache_mb) + ' MB')
@@ -0,0 +1,149 @@
+# SPDX-License-Identifier: Apache-2.0
+# Copyright (c) 2023 Adrian Przekwas <adrian.v.przekwas@gmail.com>
+
+# Opt-in timing instrumentation for sensor-builder.py, sensor-extraction.py and add_sensor_labels.py.
+# Scripts mark phases with span() and counters with count(), both do nothing until recording is started.
+# Spans are written as Chrome trace (open in chrome://tracing or https://ui.perfetto.dev) or as JSON lines,
+# counters are written at the end. Optionally the whole recording is profiled with cProfile (.prof next to the trace).
+#
+# Usage in FreeCAD Python console:
+#   import instrumentation
+#   with instrumentation.recording('/tmp/place.json', profile=True):
+#       place_cut_sensors()
+# or set PERISCOPE_TRACE=/tmp/trace.json (.jsonl for JSON lines) before starting FreeCAD to record everything until exit.
+
+import os
+import sys
+import json
+import time
+import atexit
+import cProfile
+import functools
+import threading
+from contextlib import contextmanager
+
+trace_env = 'PERISCOPE_TRACE'
+
+enabled = False
+events = []
+counters = {}
+t_start = 0.0
+profiler = None
+trace_path = None
+
+def now_us():
+    return (time.perf_counter() - t_start) * 1e6
+
+# records a phase, args are stored with the span (eg. sensor index)
+@contextmanager
+def span(name, **args):
+    if not enabled:
+        yield
+        return
+    ts = now_us()
+    try:
+        yield
+    finally:
+        events.append({'name': name, 'ph': 'X', 'ts': ts, 'dur': now_us() - ts, 'pid': os.getpid(),
+                       'tid': threading.get_ident(), 'args': args})
+
+def count(name, n = 1):
+    if enabled:
+        counters[name] = counters.get(name, 0) + n
+
+# decorator recording a span for every call of a function
+def traced(name = None):
+    def decorator(func):
+        span_name = name or func.__name__
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(span_name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def start(path = None, profile = False):
+    global enabled, t_start, profiler, trace_path
+    events.clear()
+    counters.clear()
+    trace_path = path
+    t_start = time.perf_counter()
+    enabled = True
+    if profile:
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+# stops recording, writes the trace if a path was given, returns spans and counters
+def stop():
+    global enabled, profiler
+    if not enabled:
+        return None
+    enabled = False
+    if profiler:
+        profiler.disable()
+        if trace_path:
+            profiler.dump_stats(os.path.splitext(trace_path)[0] + '.prof')
+        profiler = None
+    if trace_path:
+        write(trace_path)
+    return {'events': list(events), 'counters': dict(counters)}
+
+@contextmanager
+def recording(path = None, profile = False):
+    start(path, profile)
+    try:
+        yield
+    finally:
+        stop()
+
+# .jsonl writes one span per line followed by a counters line, anything else is Chrome trace JSON
+def write(path):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as outfile:
+        if path.endswith('.jsonl'):
+            for event in events:
+                outfile.write(json.dumps({'name': event['name'], 'start_us': event['ts'], 'dur_us': event['dur'],
+                                          'tid': event['tid'], 'args': event['args']}) + '\n')
+            outfile.write(json.dumps({'counters': counters}) + '\n')
+        else:
+            trace = list(events)
+            end = now_us()
+            for name, value in counters.items():
+                trace.append({'name': name, 'ph': 'C', 'ts': end, 'pid': os.getpid(), 'args': {name: value}})
+            json.dump({'traceEvents': trace, 'otherData': {'counters': counters}}, outfile)
+    os.replace(tmp_path, path)
+
+# sums span durations by name: {name: (calls, total seconds)}
+def summary():
+    totals = {}
+    for event in events:
+        calls, total = totals.get(event['name'], (0, 0.0))
+        totals[event['name']] = (calls + 1, total + event['dur'] / 1e6)
+    return totals
+
+def print_summary():
+    for name, (calls, total) in sorted(summary().items(), key=lambda item: -item[1][1]):
+        print(name.ljust(32) + str(calls).rjust(6) + str(round(total, 4)).rjust(12) + ' s')
+    for name, value in sorted(counters.items()):
+        print(name.ljust(32) + str(value).rjust(6))
+
+# resident memory in MB, Linux only
+def rss_mb():
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2**20
+    except (OSError, ValueError, AttributeError):
+        return float('nan')
+
+# highest resident memory of the process so far, in MB
+def peak_mb():
+    try:
+        import resource
+    except ImportError: # Windows
+        return float('nan')
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2**20 if sys.platform == 'darwin' else peak / 2**10
+
+if os.environ.get(trace_env) and not enabled:
+    start(os.environ[trace_env])
+    atexit.register(stop)
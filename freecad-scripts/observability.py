@@ -0,0 +1,199 @@
+# SPDX-License-Identifier: Apache-2.0
+# Copyright (c) 2023 Adrian Przekwas <adrian.v.przekwas@gmail.com>
+
+# Pose observability of a sensor layout, a dilution of precision (DOP) style metric.
+# For a grid of tracker orientations and base station positions, sweep angles of visible sensors are differentiated
+# with respect to the tracker pose (3 rotations, 3 translations). The Jacobian gives the Fisher information J^T J,
+# its inverse scaled by sweep angle noise is the pose covariance. Reported per pose:
+# position error (mm), orientation error (degrees) and condition number of the information matrix.
+# Coplanar, collinear or too few visible diodes give large or infinite errors.
+# Per sensor contribution is the increase of the position error when the sensor is removed.
+# Sensor geometry comes from the tracker JSON (see get_json() / get_config() in sensor-extraction.py),
+# optional .scad mesh adds self occlusion (see coverage.py).
+#
+# Usage: python3 observability.py tracker.json [tracker.scad] [--orientations 500] [--rolls 8] [--station=2,1,2 --station=-2,1,-2]
+#   stations are given with "=" (--station=-2,1,-2), otherwise argparse takes a leading minus for an option
+
+import sys
+import time
+import argparse
+import numpy as np
+
+import coverage
+import scad_mesh
+import tracker_config
+import placement_math as pm
+
+angle_noise = 1e-4 # rad, sweep angle measurement noise
+max_condition = 1e10 # information matrices with larger condition number are singular, pose can't be solved
+default_stations = [(2.0, 1.0, 2.0), (-2.0, 1.0, -2.0)] # m, y axis up
+
+def skew(v):
+    m = np.zeros(v.shape[:-1] + (3, 3))
+    m[..., 0, 1] = -v[..., 2]
+    m[..., 0, 2] = v[..., 1]
+    m[..., 1, 0] = v[..., 2]
+    m[..., 1, 2] = -v[..., 0]
+    m[..., 2, 0] = -v[..., 1]
+    m[..., 2, 1] = v[..., 0]
+    return m
+
+# rotation matrices mapping the z axis to every sphere direction, combined with rolls about that direction
+def orientation_grid(n_directions = 500, n_rolls = 8):
+    dirs = coverage.sphere_directions(n_directions)
+    z = np.array([0.0, 0.0, 1.0])
+    axis = np.cross(z, dirs)
+    sin_a = np.linalg.norm(axis, axis=1)
+    cos_a = dirs @ z
+    axis = np.where(sin_a[:, None] > 1e-12, axis / np.maximum(sin_a, 1e-12)[:, None], np.array([1.0, 0.0, 0.0]))
+    k = skew(axis)
+    align = np.eye(3) + sin_a[:, None, None] * k + (1.0 - cos_a)[:, None, None] * (k @ k)
+    rolls = np.linspace(0.0, 2.0 * np.pi, n_rolls, endpoint=False)
+    roll = np.zeros((n_rolls, 3, 3))
+    roll[:, 0, 0] = np.cos(rolls)
+    roll[:, 0, 1] = -np.sin(rolls)
+    roll[:, 1, 0] = np.sin(rolls)
+    roll[:, 1, 1] = np.cos(rolls)
+    roll[:, 2, 2] = 1.0
+    return (align[:, None] @ roll[None]).reshape(-1, 3, 3)
+
+# base station frames looking at the tracker (placed in the origin), z axis is the boresight
+def station_frames(positions, up = (0.0, 1.0, 0.0)):
+    positions = np.asarray(positions, dtype=float)
+    fwd = -positions / np.linalg.norm(positions, axis=1, keepdims=True)
+    x = np.cross(np.asarray(up, dtype=float), fwd)
+    x = x / np.linalg.norm(x, axis=1, keepdims=True)
+    y = np.cross(fwd, x)
+    return np.stack([x, y, fwd], axis=2) # columns are station axes in global coordinates
+
+# (O, B, S, 2, 6) Jacobians of horizontal and vertical sweep angles with respect to small rotation and translation,
+# and (O, B, S) visibility, points in m
+def sweep_jacobians(points, normals, rotations, stations, fov = 120.0, bvh = None):
+    frames = station_frames(stations)
+    g = np.einsum('oij,sj->osi', rotations, points)                    # (O, S, 3) sensor points
+    n = np.einsum('oij,sj->osi', rotations, normals)
+    to_station = stations[None, :, None, :] - g[:, None]                # (O, B, S, 3)
+    dist = np.linalg.norm(to_station, axis=-1)
+    facing = np.einsum('obsi,osi->obs', to_station, n) / dist
+    visible = facing >= np.cos(np.radians(fov / 2.0))
+    if bvh is not None:
+        o_idx, b_idx, s_idx = np.nonzero(visible)
+        local_dirs = np.einsum('kji,kj->ki', rotations[o_idx], to_station[o_idx, b_idx, s_idx] / dist[o_idx, b_idx, s_idx, None])
+        origins = points[s_idx] * 1000.0 + normals[s_idx] * coverage.origin_offset # mesh is in mm
+        blocked = coverage.occluded(bvh, origins, local_dirs)
+        visible[o_idx[blocked], b_idx[blocked], s_idx[blocked]] = False
+
+    rot_t = np.swapaxes(frames, 1, 2)                                   # global to station
+    q = np.einsum('bij,obsj->obsi', rot_t, -to_station)                 # points in station frames
+    x, y, z = q[..., 0], q[..., 1], q[..., 2]
+    dh = np.stack([z, np.zeros_like(z), -x], axis=-1) / (x * x + z * z)[..., None]
+    dv = np.stack([np.zeros_like(z), z, -y], axis=-1) / (y * y + z * z)[..., None]
+    dangle = np.stack([dh, dv], axis=-2)                                # (O, B, S, 2, 3) d angle / d q
+    dq_dt = rot_t[None, :, None]                                        # (1, B, 1, 3, 3)
+    dq_dw = -dq_dt @ skew(g)[:, None]                                   # (O, B, S, 3, 3)
+    jac = np.concatenate([dangle @ dq_dw, dangle @ dq_dt], axis=-1)
+    return jac, visible
+
+def pose_errors(info):
+    eig = np.linalg.eigvalsh(info)
+    solvable = eig[..., 0] * max_condition > eig[..., -1]
+    safe = np.where(solvable[..., None, None], info, np.eye(6))
+    cov = np.linalg.inv(safe) * angle_noise ** 2
+    rot_err = np.degrees(np.sqrt(np.trace(cov[..., :3, :3], axis1=-2, axis2=-1)))
+    pos_err = 1000.0 * np.sqrt(np.trace(cov[..., 3:, 3:], axis1=-2, axis2=-1))
+    cond = eig[..., -1] / np.where(solvable, eig[..., 0], 1.0)
+    return np.where(solvable, pos_err, np.inf), np.where(solvable, rot_err, np.inf), np.where(solvable, cond, np.inf)
+
+# position errors per orientation with all stations sweeping together, a cheaper metric for comparing many layouts
+def combined_position_errors(points, normals, rotations, stations, fov = 120.0):
+    jac, visible = sweep_jacobians(np.asarray(points, dtype=float), np.asarray(normals, dtype=float), rotations, np.asarray(stations, dtype=float), fov)
+    info = np.einsum('obski,obskj,obs->oij', jac, jac, visible.astype(float))
+    pos_err, _, _ = pose_errors(info)
+    return pos_err
+
+# points in m, stations in m, returns per pose (orientation, station) errors, worst poses and per sensor contribution
+def analyze_observability(points, normals, rotations = None, stations = None, fov = 120.0, bvh = None, n_worst = 10):
+    points = np.asarray(points, dtype=float)
+    normals = np.asarray(normals, dtype=float)
+    normals = normals / np.linalg.norm(normals, axis=1, keepdims=True)
+    rotations = orientation_grid() if rotations is None else rotations
+    stations = np.asarray(default_stations if stations is None else stations, dtype=float)
+
+    jac, visible = sweep_jacobians(points, normals, rotations, stations, fov, bvh)
+    sensor_info = np.einsum('obski,obskj->obsij', jac, jac) * visible[..., None, None]   # (O, B, S, 6, 6)
+    info = sensor_info.sum(axis=2)
+    pos_err, rot_err, cond = pose_errors(info)
+    # all stations sweeping the tracker at the same time
+    combined_pos_err, _, _ = pose_errors(info.sum(axis=1))
+
+    # leave one out: position error without every sensor, compared where the pose was solvable and the sensor visible
+    pos_without, _, _ = pose_errors(info[:, :, None] - sensor_info)
+    solvable = np.isfinite(pos_err)[..., None] & visible
+    lost = solvable & ~np.isfinite(pos_without)
+    ratio = np.where(solvable & ~lost, pos_without / np.where(solvable, pos_err[..., None], 1.0), np.nan)
+    n_solvable = np.maximum(solvable.sum(axis=(0, 1)), 1)
+    with np.errstate(all='ignore'):
+        ratio_median = np.array([np.median(r[np.isfinite(r)]) if np.isfinite(r).any() else 1.0 for r in ratio.reshape(-1, ratio.shape[-1]).T])
+
+    flat = pos_err.reshape(-1)
+    worst = np.argsort(-np.where(np.isfinite(flat), flat, np.finfo(float).max), kind='stable')[:n_worst]
+    worst_o, worst_b = np.unravel_index(worst, pos_err.shape)
+    return {
+        'position_error': pos_err,
+        'rotation_error': rot_err,
+        'condition': cond,
+        'visible_count': visible.sum(axis=2),
+        'unsolvable_fraction': float(np.mean(~np.isfinite(pos_err))),
+        'median_position_error': float(np.median(pos_err)),
+        'combined_position_error': combined_pos_err,
+        'combined_unsolvable_fraction': float(np.mean(~np.isfinite(combined_pos_err))),
+        'worst_orientations': rotations[worst_o],
+        'worst_stations': worst_b,
+        'worst_position_errors': pos_err[worst_o, worst_b],
+        'worst_visible_counts': visible.sum(axis=2)[worst_o, worst_b],
+        'sensor_error_increase': ratio_median - 1.0,                            # median relative increase of position error
+        'sensor_critical_fraction': lost.sum(axis=(0, 1)) / n_solvable,         # poses that become unsolvable without the sensor
+    }
+
+def parse_station(text):
+    return tuple(float(v) for v in text.split(','))
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description='Pose observability (DOP) of a tracker sensor layout')
+    parser.add_argument('json', help='tracker JSON configuration')
+    parser.add_argument('scad', nargs='?', help='tracker mesh exported as .scad, without it occlusion is not tested')
+    parser.add_argument('--orientations', type=int, default=500, help='number of tracker axis directions')
+    parser.add_argument('--rolls', type=int, default=8, help='rolls about every axis direction')
+    parser.add_argument('--station', type=parse_station, action='append', help='base station position x,y,z in m, may be repeated, eg. --station=-2,1,-2')
+    parser.add_argument('--fov', type=float, default=120.0, help='sensor field of view, in degrees')
+    parser.add_argument('--worst', type=int, default=10, help='number of worst poses to print')
+    args = parser.parse_args(argv)
+
+    points, normals = coverage.config_sensors(tracker_config.load_config(args.json))
+    points = points / 1000.0
+    bvh = None
+    if args.scad:
+        vertices, faces = scad_mesh.load_scad_polyhedron(args.scad)
+        bvh = coverage.build_bvh(vertices, faces)
+    t0 = time.perf_counter()
+    result = analyze_observability(points, normals, orientation_grid(args.orientations, args.rolls), args.station, args.fov, bvh, args.worst)
+    t1 = time.perf_counter()
+
+    pos_err = result['position_error']
+    print('Poses: ' + str(pos_err.size) + ', time: ' + str(round(t1 - t0, 3)) + ' s')
+    print('Unsolvable poses: ' + str(round(100.0 * result['unsolvable_fraction'], 2)) + ' %, median position error: '
+          + str(round(result['median_position_error'], 4)) + ' mm (angle noise ' + str(angle_noise) + ' rad)')
+    combined = result['combined_position_error']
+    print('All stations together: unsolvable orientations ' + str(round(100.0 * result['combined_unsolvable_fraction'], 2))
+          + ' %, median position error: ' + str(round(float(np.median(combined)), 4)) + ' mm')
+    print('Worst poses (tracker rotation quaternion x, y, z, w / station / visible sensors / position error mm):')
+    quats = pm.matrix_to_quat(result['worst_orientations'])
+    for quat, station, count, err in zip(quats, result['worst_stations'], result['worst_visible_counts'], result['worst_position_errors']):
+        print('  ' + str(np.round(quat, 4).tolist()) + ' / ' + str(int(station)) + ' / ' + str(int(count)) + ' / ' + str(round(float(err), 4)))
+    print('Sensor contribution (median position error increase when removed / poses lost without it):')
+    for idx, (increase, critical) in enumerate(zip(result['sensor_error_increase'], result['sensor_critical_fraction'])):
+        print('  ' + str(idx) + ': ' + str(round(100.0 * float(increase), 2)) + ' % / ' + str(round(100.0 * float(critical), 2)) + ' %')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,97 @@
+# SPDX-License-Identifier: Apache-2.0
+# Copyright (c) 2023 Adrian Przekwas <adrian.v.przekwas@gmail.com>
+
+# Placement math without FreeCAD, on stacked arrays.
+# A set of N placements is stored as a (N, 4, 4) array of homogeneous matrices, translations in mm like in FreeCAD.
+# Quaternions use FreeCAD order (x, y, z, w), the same as App.Rotation.Q
+# FreeCAD scripts only gather raw placements with from_placements(), everything else works on plain numpy arrays.
+
+import numpy as np
+
+mm_to_m = 0.001
+
+# (N, 4) quaternions (x, y, z, w) to (N, 3, 3) rotation matrices
+def quat_to_matrix(quats):
+    q = np.asarray(quats, dtype=float)
+    q = q / np.linalg.norm(q, axis=-1, keepdims=True)
+    x, y, z, w = q[..., 0], q[..., 1], q[..., 2], q[..., 3]
+    m = np.empty(q.shape[:-1] + (3, 3))
+    m[..., 0, 0] = 1 - 2 * (y * y + z * z)
+    m[..., 0, 1] = 2 * (x * y - z * w)
+    m[..., 0, 2] = 2 * (x * z + y * w)
+    m[..., 1, 0] = 2 * (x * y + z * w)
+    m[..., 1, 1] = 1 - 2 * (x * x + z * z)
+    m[..., 1, 2] = 2 * (y * z - x * w)
+    m[..., 2, 0] = 2 * (x * z - y * w)
+    m[..., 2, 1] = 2 * (y * z + x * w)
+    m[..., 2, 2] = 1 - 2 * (x * x + y * y)
+    return m
+
+# (N, 3, 3) rotation matrices to (N, 4) quaternions (x, y, z, w), with w >= 0
+def matrix_to_quat(rots):
+    r = np.asarray(rots, dtype=float)
+    trace = r[..., 0, 0] + r[..., 1, 1] + r[..., 2, 2]
+    # candidates computed from the largest diagonal term, stable for all rotations
+    cands = np.stack([
+        np.stack([r[..., 2, 1] - r[..., 1, 2], r[..., 0, 2] - r[..., 2, 0], r[..., 1, 0] - r[..., 0, 1], 1 + trace], axis=-1),
+        np.stack([1 + r[..., 0, 0] - r[..., 1, 1] - r[..., 2, 2], r[..., 0, 1] + r[..., 1, 0], r[..., 0, 2] + r[..., 2, 0], r[..., 2, 1] - r[..., 1, 2]], axis=-1),
+        np.stack([r[..., 0, 1] + r[..., 1, 0], 1 - r[..., 0, 0] + r[..., 1, 1] - r[..., 2, 2], r[..., 1, 2] + r[..., 2, 1], r[..., 0, 2] - r[..., 2, 0]], axis=-1),
+        np.stack([r[..., 0, 2] + r[..., 2, 0], r[..., 1, 2] + r[..., 2, 1], 1 - r[..., 0, 0] - r[..., 1, 1] + r[..., 2, 2], r[..., 1, 0] - r[..., 0, 1]], axis=-1),
+    ], axis=-2)
+    diag = np.stack([trace, r[..., 0, 0], r[..., 1, 1], r[..., 2, 2]], axis=-1)
+    best = np.argmax(diag, axis=-1)
+    q = np.take_along_axis(cands, best[..., None, None], axis=-2)[..., 0, :]
+    q = q / np.linalg.norm(q, axis=-1, keepdims=True)
+    return np.where(q[..., 3:4] < 0, -q, q)
+
+def placements_to_matrices(bases, quats):
+    bases = np.asarray(bases, dtype=float)
+    m = np.zeros(bases.shape[:-1] + (4, 4))
+    m[..., :3, :3] = quat_to_matrix(quats)
+    m[..., :3, 3] = bases
+    m[..., 3, 3] = 1.0
+    return m
+
+def matrices_to_placements(mats):
+    mats = np.asarray(mats, dtype=float)
+    return mats[..., :3, 3].copy(), matrix_to_quat(mats[..., :3, :3])
+
+# gathers FreeCAD placements (anything with Base.x/y/z and Rotation.Q) into (N, 4, 4) array
+def from_placements(placements):
+    bases = np.array([(pl.Base.x, pl.Base.y, pl.Base.z) for pl in placements], dtype=float).reshape(-1, 3)
+    quats = np.array([tuple(pl.Rotation.Q) for pl in placements], dtype=float).reshape(-1, 4)
+    return placements_to_matrices(bases, quats)
+
+# a * b, the same as Placement multiplication in FreeCAD, arrays are broadcast
+def compose(a, b):
+    return np.matmul(a, b)
+
+# inverse of rigid transformations
+def invert(mats):
+    mats = np.asarray(mats, dtype=float)
+    inv = np.zeros_like(mats)
+    rot_t = np.swapaxes(mats[..., :3, :3], -1, -2)
+    inv[..., :3, :3] = rot_t
+    inv[..., :3, 3] = -np.matmul(rot_t, mats[..., :3, 3:4])[..., 0]
+    inv[..., 3, 3] = 1.0
+    return inv
+
+# local axis (0 - X, 1 - Y, 2 - Z) in global coordinates, Z axis of a diode LCS is its normal
+def axes(mats, axis):
+    return np.asarray(mats)[..., :3, axis]
+
+def normals(mats):
+    return axes(mats, 2)
+
+def positions(mats, scale = 1.0):
+    return np.asarray(mats)[..., :3, 3] * scale
+
+# global diode points (in meters) and normals, from sensor link placements and their LCS-Diode placements
+def diode_points_normals(link_mats, lcsdiode_mats):
+    diode_mats = compose(link_mats, lcsdiode_mats)
+    return positions(diode_mats, mm_to_m), normals(diode_mats)
+
+# IMU position (in meters), +X and +Z axes, from mainboard link placement and its LCS-IMU placement
+def imu_frame(link_mat, lcsimu_mat):
+    imu_mat = compose(link_mat, lcsimu_mat)
+    return positions(imu_mat, mm_to_m), axes(imu_mat, 0), axes(imu_mat, 2)
@@ -0,0 +1,153 @@
+# SPDX-License-Identifier: Apache-2.0
+# Copyright (c) 2023 Adrian Przekwas <adrian.v.przekwas@gmail.com>
+
+# Sensor placement optimizer, works on candidate sites (points in mm and normals) sampled on the tracker surface.
+# A layout is a list of site indices, one per sensor. Its score is the fraction of directions with at least min_visible
+# sensors (coverage.py) plus obs_weight times the fraction of orientations where the pose can be solved (observability.py).
+# The search moves one sensor at a time to a better site (steepest ascent), respecting minimum spacing between sensors.
+# Visibility of every site from every direction is computed once, so the coverage part of a score is just a column sum.
+# Moves are pruned early: coverage + obs_weight is an upper bound of a score, moves that can't beat the best one are skipped.
+# Remaining moves are evaluated in a pool of processes (on Linux).
+# In FreeCAD, optimize_sensors() in sensor-builder.py samples sites and applies the result back to the sensors.
+
+import os
+import sys
+import multiprocessing
+import numpy as np
+
+import coverage
+import observability
+
+defaults = {
+    'n_directions': 2000,
+    'fov': 120.0,
+    'min_visible': 5,
+    'min_spacing': 10.0,     # mm, between sensor sites
+    'move_radius': 30.0,     # mm, sites considered near the current site of a sensor
+    'near_candidates': 12,   # per sensor and round
+    'far_candidates': 4,     # random sites anywhere, per sensor and round
+    'obs_weight': 1.0,
+    'obs_orientations': 100,
+    'obs_rolls': 4,
+    'stations': observability.default_stations,
+    'max_rounds': 50,
+    'seed': 0,
+}
+
+worker_state = {}
+
+def init_worker(state):
+    worker_state.clear()
+    worker_state.update(state)
+
+def coverage_score(vis, layout, min_visible):
+    return float(np.mean(vis[:, layout].sum(axis=1) >= min_visible))
+
+def layout_score(layout, state = None):
+    state = state or worker_state
+    layout = np.asarray(layout)
+    score = coverage_score(state['vis'], layout, state['min_visible'])
+    if state['obs_weight']:
+        pos_err = observability.combined_position_errors(state['sites'][layout] / 1000.0, state['normals'][layout],
+                                                         state['rotations'], state['stations'], state['fov'])
+        score += state['obs_weight'] * float(np.mean(np.isfinite(pos_err)))
+    return score
+
+# forked workers only on Linux, fork of the multi-threaded FreeCAD process isn't safe on macOS
+# and spawned workers would start a new FreeCAD instance, elsewhere moves are evaluated serially
+def make_pool(processes, state):
+    if processes == 1 or not sys.platform.startswith('linux'):
+        return None
+    return multiprocessing.get_context('fork').Pool(processes, initializer=init_worker, initargs=(state,))
+
+def spacing_ok(sites, layout, slot, site, min_spacing):
+    others = np.delete(layout, slot)
+    if site in others:
+        return False
+    if not len(others):
+        return True
+    return np.min(np.linalg.norm(sites[others] - sites[site], axis=1)) >= min_spacing
+
+def candidate_moves(sites, layout, allowed, opts, rng):
+    moves = []
+    allowed_idx = np.nonzero(allowed)[0]
+    for slot, current in enumerate(layout):
+        dist = np.linalg.norm(sites[allowed_idx] - sites[current], axis=1)
+        near = allowed_idx[np.argsort(dist)]
+        near = near[(near != current)][:opts['near_candidates'] * 4]
+        near = near[np.linalg.norm(sites[near] - sites[current], axis=1) <= opts['move_radius']][:opts['near_candidates']]
+        far = rng.choice(allowed_idx, size=min(opts['far_candidates'], len(allowed_idx)), replace=False)
+        for site in np.concatenate([near, far]):
+            if site != current and spacing_ok(sites, layout, slot, site, opts['min_spacing']):
+                moves.append((slot, int(site)))
+    return moves
+
+# sites (C, 3) in mm, normals (C, 3), initial_layout - site index for every sensor, allowed - (C,) bool mask of sites
+# outside keep-outs, mesh (vertices, faces) in mm for self occlusion. Returns the best layout, its score and history of scores.
+def optimize_layout(sites, normals, initial_layout, allowed = None, mesh = None, processes = None, **options):
+    opts = dict(defaults)
+    opts.update(options)
+    sites = np.asarray(sites, dtype=float)
+    normals = np.asarray(normals, dtype=float)
+    normals = normals / np.linalg.norm(normals, axis=1, keepdims=True)
+    allowed = np.ones(len(sites), dtype=bool) if allowed is None else np.asarray(allowed, dtype=bool)
+    rng = np.random.default_rng(opts['seed'])
+
+    bvh = coverage.build_bvh(*mesh) if mesh is not None else None
+    directions = coverage.sphere_directions(opts['n_directions'])
+    state = {
+        'vis': coverage.sensor_visibility(sites, normals, directions, opts['fov'], bvh),
+        'sites': sites,
+        'normals': normals,
+        'rotations': observability.orientation_grid(opts['obs_orientations'], opts['obs_rolls']),
+        'stations': np.asarray(opts['stations'], dtype=float),
+        'fov': opts['fov'],
+        'min_visible': opts['min_visible'],
+        'obs_weight': opts['obs_weight'],
+    }
+    processes = processes or os.cpu_count() or 1
+    pool = make_pool(processes, state)
+
+    layout = np.array(initial_layout)
+    best = layout_score(layout, state)
+    history = [best]
+    evaluated = 0
+    pruned = 0
+    try:
+        for _ in range(opts['max_rounds']):
+            moves = candidate_moves(sites, layout, allowed, opts, rng)
+            layouts = []
+            bounds = []
+            for slot, site in moves:
+                new_layout = layout.copy()
+                new_layout[slot] = site
+                layouts.append(new_layout)
+                bounds.append(coverage_score(state['vis'], new_layout, opts['min_visible']) + opts['obs_weight'])
+            order = np.argsort(bounds)[::-1]
+            round_best = best
+            round_layout = None
+            round_evaluated = 0
+            for lo in range(0, len(order), processes):
+                chunk = [idx for idx in order[lo:lo + processes] if bounds[idx] > round_best]
+                if not chunk:
+                    break # moves are sorted by bound, none of the remaining ones can be better
+                chunk_layouts = [layouts[idx] for idx in chunk]
+                scores = pool.map(layout_score, chunk_layouts) if pool else [layout_score(l, state) for l in chunk_layouts]
+                round_evaluated += len(chunk)
+                for idx, score in zip(chunk, scores):
+                    if score > round_best:
+                        round_best = score
+                        round_layout = layouts[idx]
+            evaluated += round_evaluated
+            pruned += len(moves) - round_evaluated
+            if round_layout is None:
+                break
+            layout = round_layout
+            best = round_best
+            history.append(best)
+            print('Optimizer: score ' + str(round(best, 4)) + ', evaluated ' + str(evaluated) + ', pruned ' + str(pruned))
+    finally:
+        if pool:
+            pool.close()
+            pool.join()
+    return layout, best, history
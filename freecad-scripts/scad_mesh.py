@@ -0,0 +1,194 @@
+# SPDX-License-Identifier: Apache-2.0
+# Copyright (c) 2023 Adrian Przekwas <adrian.v.przekwas@gmail.com>
+
+# Reader and writer for OpenSCAD polyhedron models, like tracker-json/tracker.scad exported for simulation.
+# read_scad_polyhedron() tokenizes points and faces directly into NumPy arrays: (N, 3) float points and (M, 3) int triangles.
+# load_scad_polyhedron() also keeps a binary cache keyed by the file content hash, reloading an unchanged mesh
+# only maps two .npy files into memory.
+# write_scad_polyhedron() writes arrays in the same format as FreeCAD OpenSCAD export, write_stl() as binary STL.
+# Only polyhedron() statements are read, transformations around them are ignored (FreeCAD exports meshes in global coordinates).
+#
+# Usage: python3 scad_mesh.py tracker.scad (prints mesh size and load times)
+#        python3 scad_mesh.py --check (writes and reads back empty, small and spaced meshes)
+
+import os
+import re
+import sys
+import mmap
+import time
+import hashlib
+import numpy as np
+
+cache_env = 'PERISCOPE_CACHE'
+separators = bytes.maketrans(b'[],', b'   ')
+polyhedron_re = re.compile(rb'polyhedron\s*\(')
+points_re = re.compile(rb'points\s*=\s*\[')
+faces_re = re.compile(rb'(faces|triangles)\s*=\s*\[')
+polygon_sep_re = re.compile(rb'\]\s*,')
+
+def default_cache_dir():
+    base = os.environ.get(cache_env) or os.path.join(os.path.expanduser('~'), '.cache', 'periscope')
+    return os.path.join(base, 'scad')
+
+# returns [start, end) of a list literal starting at start ("[...]"), brackets are matched by depth,
+# counted with NumPy over growing chunks of the file
+def list_span(data, start, chunk = 1 << 16):
+    depth = 0
+    pos = start
+    while pos < len(data):
+        block = np.frombuffer(data[pos:pos + chunk], dtype=np.uint8)
+        levels = depth + np.cumsum((block == ord('[')).astype(np.int64) - (block == ord(']')))
+        closed = np.nonzero(levels <= 0)[0]
+        if len(closed):
+            return start, pos + int(closed[0]) + 1
+        depth = int(levels[-1])
+        pos += len(block)
+        chunk *= 2
+    raise ValueError('Unterminated list in SCAD file at offset ' + str(start))
+
+def parse_numbers(segment, dtype):
+    text = segment.translate(separators)
+    if not text.strip(): # fromstring() returns -1 for an empty string
+        return np.zeros(0, dtype=dtype)
+    return np.fromstring(text, dtype=dtype, sep=' ')
+
+# faces with more than 3 vertices are split into triangle fans
+def parse_polygons(segment):
+    triangles = []
+    for face in polygon_sep_re.split(segment[1:-1]):
+        idx = np.fromstring(face.translate(separators), dtype=np.int64, sep=' ')
+        if len(idx) >= 3:
+            fan = np.empty((len(idx) - 2, 3), dtype=np.int64)
+            fan[:, 0] = idx[0]
+            fan[:, 1] = idx[1:-1]
+            fan[:, 2] = idx[2:]
+            triangles.append(fan)
+    if not triangles:
+        return np.zeros((0, 3), dtype=np.int64)
+    return np.concatenate(triangles)
+
+def parse_polyhedra(data):
+    all_points = []
+    all_faces = []
+    offset = 0
+    for match in polyhedron_re.finditer(data):
+        pts = points_re.search(data, match.end())
+        fcs = faces_re.search(data, match.end())
+        if not pts or not fcs:
+            raise ValueError('polyhedron without points or faces at offset ' + str(match.start()))
+        p_start, p_end = list_span(data, pts.end() - 1)
+        f_start, f_end = list_span(data, fcs.end() - 1)
+        points = parse_numbers(data[p_start:p_end], np.float64).reshape(-1, 3)
+        segment = data[f_start:f_end]
+        faces = parse_numbers(segment, np.int64)
+        if len(faces) == 3 * (segment.count(b'[') - 1):
+            faces = faces.reshape(-1, 3)
+        else:
+            faces = parse_polygons(segment)
+        all_points.append(points)
+        all_faces.append(faces + offset)
+        offset += len(points)
+    if not all_points:
+        raise ValueError('No polyhedron found')
+    return np.concatenate(all_points), np.concatenate(all_faces)
+
+def read_scad_polyhedron(filename):
+    with open(filename, 'rb') as infile:
+        with mmap.mmap(infile.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            return parse_polyhedra(data)
+
+def file_hash(filename):
+    digest = hashlib.sha256()
+    with open(filename, 'rb') as infile:
+        for chunk in iter(lambda: infile.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+# same as read_scad_polyhedron(), but parsed arrays are cached in cache_dir, keyed by the file content hash
+def load_scad_polyhedron(filename, cache_dir = None):
+    cache_dir = cache_dir or default_cache_dir()
+    key_dir = os.path.join(cache_dir, file_hash(filename))
+    points_file = os.path.join(key_dir, 'points.npy')
+    faces_file = os.path.join(key_dir, 'faces.npy')
+    try:
+        return np.load(points_file, mmap_mode='r'), np.load(faces_file, mmap_mode='r')
+    except (OSError, ValueError):
+        pass
+    points, faces = read_scad_polyhedron(filename)
+    os.makedirs(key_dir, exist_ok=True)
+    for name, arr in (('points', points), ('faces', faces)):
+        tmp_file = os.path.join(key_dir, name + '.tmp.npy')
+        np.save(tmp_file, arr)
+        os.replace(tmp_file, os.path.join(key_dir, name + '.npy'))
+    return points, faces
+
+def format_rows(arr, fmt):
+    row = '[' + ','.join([fmt] * arr.shape[1]) + ']'
+    lines = (row * len(arr)).replace('][', '],[') if len(arr) else ''
+    return lines % tuple(arr.ravel().tolist())
+
+def write_scad_polyhedron(filename, points, faces, comment = 'CSG file generated by scad_mesh.py'):
+    points = np.asarray(points, dtype=float)
+    faces = np.asarray(faces, dtype=np.int64)
+    tmp_file = filename + '.tmp'
+    with open(tmp_file, 'w') as outfile:
+        outfile.write('// ' + comment + '\n')
+        outfile.write('group() {\n group(){\n')
+        outfile.write('polyhedron ( points = [')
+        outfile.write(format_rows(points, '%f'))
+        outfile.write('], faces = [')
+        outfile.write(format_rows(faces, '%d'))
+        outfile.write(']);\n}\n}\n')
+    os.replace(tmp_file, filename)
+
+stl_dtype = np.dtype([('normal', '<f4', (3,)), ('vertices', '<f4', (3, 3)), ('attr', '<u2')])
+
+def write_stl(filename, points, faces, header = 'STL file generated by scad_mesh.py'):
+    points = np.asarray(points, dtype=float)
+    faces = np.asarray(faces, dtype=np.int64)
+    tris = points[faces]
+    normals = np.cross(tris[:, 1] - tris[:, 0], tris[:, 2] - tris[:, 0])
+    lengths = np.linalg.norm(normals, axis=1, keepdims=True)
+    normals = np.divide(normals, lengths, out=np.zeros_like(normals), where=lengths > 0)
+    data = np.zeros(len(faces), dtype=stl_dtype)
+    data['normal'] = normals
+    data['vertices'] = tris
+    tmp_file = filename + '.tmp'
+    with open(tmp_file, 'wb') as outfile:
+        outfile.write(header.encode('ascii', 'replace')[:80].ljust(80, b' '))
+        outfile.write(np.uint32(len(faces)).tobytes())
+        outfile.write(data.tobytes())
+    os.replace(tmp_file, filename)
+
+# writes and reads back meshes (empty, triangles, polygons written with spaces), raises AssertionError on a mismatch
+def check_round_trip(tmp_dir = None):
+    import tempfile
+    tmp_dir = tmp_dir or tempfile.mkdtemp()
+    points = np.array([[0.0, 0.0, 0.0], [1.0, 0.0, 0.0], [1.0, 1.0, 0.0], [0.0, 1.0, 0.5]])
+    faces = np.array([[0, 1, 2], [0, 2, 3]])
+    for idx, (pts, fcs) in enumerate([(points, faces), (points, np.zeros((0, 3), dtype=np.int64)), (np.zeros((0, 3)), np.zeros((0, 3), dtype=np.int64))]):
+        filename = os.path.join(tmp_dir, 'round_trip' + str(idx) + '.scad')
+        write_scad_polyhedron(filename, pts, fcs)
+        read_pts, read_fcs = read_scad_polyhedron(filename)
+        assert np.allclose(read_pts, pts) and read_pts.shape == pts.shape, filename
+        assert np.array_equal(read_fcs, fcs) and read_fcs.shape == fcs.shape, filename
+    spaced = b'polyhedron ( points = [ [0, 0, 0] , [1, 0, 0] ,[1, 1, 0], [0, 1, 0] ] , faces = [ [0, 1, 2, 3] , [ 0, 2, 1 ] ] );'
+    read_pts, read_fcs = parse_polyhedra(spaced)
+    assert read_pts.shape == (4, 3), 'spaced points'
+    assert np.array_equal(read_fcs, [[0, 1, 2], [0, 2, 3], [0, 2, 1]]), 'spaced faces'
+    return True
+
+if __name__ == '__main__':
+    if sys.argv[1:] == ['--check']:
+        print('Round trip: ' + ('ok' if check_round_trip() else 'failed'))
+        sys.exit(0)
+    for filename in sys.argv[1:]:
+        t0 = time.perf_counter()
+        points, faces = read_scad_polyhedron(filename)
+        t1 = time.perf_counter()
+        load_scad_polyhedron(filename)
+        t2 = time.perf_counter()
+        load_scad_polyhedron(filename)
+        t3 = time.perf_counter()
+        print(filename + ': ' + str(len(points)) + ' points, ' + str(len(faces)) + ' triangles')
+        print('  parse: ' + str(round(t1 - t0, 4)) + ' s, first load: ' + str(round(t2 - t1, 4)) + ' s, cached load: ' + str(round(t3 - t2, 4)) + ' s')
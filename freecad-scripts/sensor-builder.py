@@ -17,13 +17,37 @@
 # Place sensors near to "tracker-base" surface
 # Run place_cut_sensors() - it will find closest point on the support shape surface for every sensor, move sensors and prepare support places
 # You can do a manual adjustment of a sensor placement, after this use recut_sensors() to recreate support places
-# You can save (in a spreadsheet object) adjustments values with save_corr() and load them with load_corr()
+# recut_sensors(incremental=True) re-cuts only sensors moved since its previous run
+# place_cut_sensors_progressive() shows the "stamp-simplified" cut at once and swaps in the full cut computed in background
+# optimize_sensors() searches better sensor positions on the tracker surface, then use recut_sensors()
+# You can save adjustments values with save_corr() and load them with load_corr(), several named sets can be kept (see correction_store.py)
 # place_cut_sensors(True) and recut_sensors(True) uses "stamp-simplified" for cutting shape
 
+import os
+import sys
 import FreeCAD as App
-import FreeCADGui as Gui
 import Part
 import math
+import gc
+import time
+import functools
+import numpy as np
+from contextlib import contextmanager
+try:
+    scripts_dir = os.path.dirname(os.path.abspath(__file__))
+    if scripts_dir not in sys.path:
+        sys.path.append(scripts_dir)
+except NameError: # pasted into the Python console, freecad-scripts directory has to be in sys.path already
+    pass
+import placement_math as pm
+import doc_index
+import instrumentation as ins
+import sim_export
+import clearance
+import background_cut
+import correction_store as corr_store
+import geometry_cache
+import watch_mode
 
 doc = App.ActiveDocument
 sensor_label = 'sensor'
@@ -34,13 +58,84 @@ mainboard_label = 'tracker-mainboard'
 
 initial_dir = App.Vector(-1, 0, 0) # sets initial orientation of sensors,
                                    # later modified by mainboard orientation
-
-Gui.activateWorkbench('PartDesignWorkbench')
-Gui.ActiveDocument.ActiveView.setActiveObject('pdbody',doc.getObjectsByLabel(tracker_base_label)[0])
+keepout_labels = [mainboard_label] # optimize_sensors() doesn't place sensors inside bounding boxes of these objects
+keepout_margin = 2.0 # mm
+auto_clearance = True # check_clearance() after place_cut_sensors() and recut_sensors()
+
+# shared label and linked LCS lookups, refreshed by a document observer (see doc_index.py)
+def lookup():
+    return doc_index.get_index(doc)
+
+if App.GuiUp:
+    import FreeCADGui as Gui
+    Gui.activateWorkbench('PartDesignWorkbench')
+    Gui.ActiveDocument.ActiveView.setActiveObject('pdbody',doc.getObjectsByLabel(tracker_base_label)[0])
+
+# switches the document the builder works on, used when the script is loaded headless (see tracker_batch.py)
+def set_document(new_doc):
+    global doc
+    doc = new_doc
+    recut_cache.clear()
+
+batch_depth = 0
+recompute_pending = False
+
+# inside batch_recompute() recomputes are only marked as pending, a single recompute runs when the outermost batch ends
+def recompute():
+    global recompute_pending
+    if batch_depth > 0:
+        recompute_pending = True
+        ins.count('recomputes_deferred')
+    else:
+        with ins.span('recompute'):
+            doc.recompute()
+        ins.count('recomputes')
+
+# runs a pending recompute now, needed when placements computed by the document (eg. attached LCS-es) are read inside a batch
+def flush_recompute():
+    global recompute_pending
+    if recompute_pending:
+        recompute_pending = False
+        with ins.span('recompute'):
+            doc.recompute()
+        ins.count('recomputes')
+
+# groups document edits into a single recompute and a single undo transaction, may be nested
+@contextmanager
+def batch_recompute(name = 'Sensor builder'):
+    global batch_depth, recompute_pending
+    if batch_depth == 0:
+        doc.openTransaction(name)
+    batch_depth += 1
+    watch_mode.builder_depth += 1 # placements set by the builder aren't corrections
+    done = False
+    try:
+        yield
+        done = True
+    finally:
+        batch_depth -= 1
+        watch_mode.builder_depth -= 1
+        if batch_depth == 0:
+            if done:
+                flush_recompute()
+                doc.commitTransaction()
+            else:
+                recompute_pending = False
+                doc.abortTransaction()
+                doc.recompute()
+
+def batched(name):
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with batch_recompute(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
 
 def add_vertex(vec, name):
     if doc.getObject(name) == None:
-        doc.getObjectsByLabel(tracker_base_label)[0].newObject('PartDesign::Point', name)
+        lookup().objects_by_label(tracker_base_label)[0].newObject('PartDesign::Point', name)
 
     vtx = doc.getObject(name)
     vtx.Placement=App.Placement(App.Vector(vec.x,vec.y,vec.z),App.Rotation(App.Vector(0.00,0.00,1.00),0.00))
@@ -48,12 +143,12 @@ def add_vertex(vec, name):
 
 def add_attach_lcs(pvtx, nvtx, avtx, name):
     if doc.getObject(name) == None:
-        doc.getObjectsByLabel(tracker_base_label)[0].newObject('PartDesign::CoordinateSystem', name)
+        lookup().objects_by_label(tracker_base_label)[0].newObject('PartDesign::CoordinateSystem', name)
 
     lcs = doc.getObject(name)
     lcs.Support = [(pvtx,''),(nvtx,''),(avtx,'')]
     lcs.MapMode = 'OZX'
-    doc.recompute()
+    recompute()
     return lcs
 
 def find_point_normal(shape, pos):
@@ -65,6 +160,7 @@ def find_point_normal(shape, pos):
             last_point_on_face = App.Vector(0.0, 0.0, 0.0)
             last_normal = App.Vector(0.0, 0.0, 0.0)
             for face in solid.Faces:
+                ins.count('faces_examined')
                 distance, point_on_face, info = vertex.distToShape(face) #Returns: float<minimum distance>,list<nearest points>,list<nearest subshapes & parameters>
                 surf = face.Surface
                 u, v = surf.parameter(point_on_face[0][1]) #why [0][1]? https://github.com/FreeCAD/FreeCAD-documentation/blob/main/wiki/TopoShape_API.md
@@ -78,22 +174,89 @@ def find_point_normal(shape, pos):
 
             return last_point_on_face, last_normal
 
+face_bbox_margin = 0.5 # mm, face bounding boxes may be computed from a coarse triangulation, so enlarge them a bit
+
+# face bounding boxes (N, 6) of the first valid solid, used for pruning faces in nearest point lookups
+def face_bounds(shape):
+    for solid_idx, solid in enumerate(shape.Solids):
+        if solid.isValid():
+            bounds = np.zeros((len(solid.Faces), 6))
+            for idx, face in enumerate(solid.Faces):
+                bb = face.BoundBox
+                bb.enlarge(face_bbox_margin)
+                bounds[idx] = (bb.XMin, bb.YMin, bb.ZMin, bb.XMax, bb.YMax, bb.ZMax)
+            return np.array([solid_idx]), bounds
+    return np.array([-1]), np.zeros((0, 6))
+
+# builds face bounding boxes once per tracker shape, kept in the geometry cache for the next sessions (see geometry_cache.py)
+def build_face_index(shape):
+    key = geometry_cache.shape_key(shape)
+    solid, bounds = geometry_cache.cached(key, ('face_solid', 'face_bounds_' + str(face_bbox_margin)), lambda: face_bounds(shape))
+    if solid[0] < 0:
+        return [], bounds
+    return shape.Solids[int(solid[0])].Faces, bounds
+
+def box_distances(bounds, pos): # lower bounds of distances between pos and anything inside the boxes
+    p = np.array([pos.x, pos.y, pos.z])
+    return np.linalg.norm(np.maximum(np.maximum(bounds[:, :3] - p, 0.0), p - bounds[:, 3:]), axis=1)
+
+# same result as find_point_normal() called for every position, but faces are visited in order of their bounding box distance
+# and exact distToShape stops as soon as no remaining face box can be closer than the best face found
+def find_points_normals(shape, positions, face_index = None):
+    if face_index is None:
+        face_index = build_face_index(shape)
+    faces, bounds = face_index
+    points_normals = []
+    for sensor_idx, pos in enumerate(positions):
+        with ins.span('project', sensor=sensor_idx):
+            vertex = Part.Vertex(pos)
+            lower_bounds = box_distances(bounds, pos)
+            min_distance = 10000.0
+            best_face = None
+            best_point = App.Vector(0.0, 0.0, 0.0)
+            for idx in np.argsort(lower_bounds, kind='stable'):
+                if lower_bounds[idx] >= min_distance:
+                    break
+                ins.count('faces_examined')
+                distance, point_on_face, info = vertex.distToShape(faces[idx])
+                if (distance < min_distance):
+                    min_distance = distance
+                    best_face = faces[idx]
+                    best_point = point_on_face[0][1]
+            normal = App.Vector(0.0, 0.0, 0.0)
+            if best_face:
+                u, v = best_face.Surface.parameter(best_point)
+                normal = best_face.normalAt(u, v)
+            points_normals.append((best_point, normal))
+    return points_normals
+
 def find_pl(s):
     try:
         link_pl = s.LinkPlacement
-        s_doc = s.getLinkedObject().Document
-        lcsbase_pl = s_doc.getObjectsByLabel('LCS-Base')[0].Placement
+        lcsbase_pl = lookup().linked_placement(s, 'LCS-Base')
     except:
         print("No LCS-Base found, aborting")
         return None, None
     return link_pl, lcsbase_pl
 
+# combined LinkPlacement * LCS-Base placements of all sensors, as (N, 4, 4) array
+def sensor_base_matrices(sensors):
+    link_pls = []
+    lcsbase_pls = []
+    for s in sensors:
+        link_pl, lcsbase_pl = find_pl(s)
+        link_pls.append(link_pl)
+        lcsbase_pls.append(lcsbase_pl)
+    return pm.compose(pm.from_placements(link_pls), pm.from_placements(lcsbase_pls))
+
+def matrix_placement(mat):
+    return App.Placement(App.Matrix(*mat.ravel().tolist()))
+
 def find_mainboard_imu_pl():
     try:
-        mb = doc.getObjectsByLabel(mainboard_label)[0]
+        mb = lookup().objects_by_label(mainboard_label)[0]
         link_pl = mb.LinkPlacement
-        mb_doc = mb.getLinkedObject().Document
-        lcsimu_pl = mb_doc.getObjectsByLabel('LCS-IMU')[0].Placement
+        lcsimu_pl = lookup().linked_placement(mb, 'LCS-IMU')
     except:
         print("No LCS-IMU found, aborting")
         return None, None
@@ -103,18 +266,26 @@ def create_lcses_sensors (sensors, tracker_shape):
     mb_link_pl, _ = find_mainboard_imu_pl()
     dir = mb_link_pl.Rotation * initial_dir
     lcses = []
+    positions = []
+    with ins.span('lookup', sensors=len(sensors)):
+        base_mats = sensor_base_matrices(sensors)
+    for total_mat in base_mats:
+        print (matrix_placement(total_mat))
+        positions.append(App.Vector(*pm.positions(total_mat).tolist()))
+    with ins.span('face_index'):
+        face_index = build_face_index(tracker_shape)
+    points_normals = find_points_normals(tracker_shape, positions, face_index)
     for idx, s in enumerate(sensors):
-        link_pl, lcsbase_pl = find_pl(s)
-        total_pl = link_pl * lcsbase_pl
-        print (total_pl)
-        position = total_pl.Base
-        point, normal = find_point_normal(tracker_shape, position)
+        point, normal = points_normals[idx]
         print (point, normal)
-        pvtx = add_vertex(point, 'p_surf' + str (idx))
-        nvtx = add_vertex((point + normal), 'p_norm' + str (idx))
-        avtx = add_vertex((point + dir), 'p_aux' + str (idx))
-        lcs = add_attach_lcs(pvtx, nvtx, avtx, 's_lcs' + str (idx))
+        with ins.span('create_lcs', sensor=idx):
+            pvtx = add_vertex(point, 'p_surf' + str (idx))
+            nvtx = add_vertex((point + normal), 'p_norm' + str (idx))
+            avtx = add_vertex((point + dir), 'p_aux' + str (idx))
+            lcs = add_attach_lcs(pvtx, nvtx, avtx, 's_lcs' + str (idx))
+            lcs.Label2 = s.Name # owning sensor, see DocIndex.sensor_lcses()
         lcses.append(lcs)
+    flush_recompute() # attached LCS placements are read later
     return lcses
 
 def move_to_lcses(lcses, sensors):
@@ -124,7 +295,7 @@ def move_to_lcses(lcses, sensors):
         link_pl, lcsbase_pl = find_pl(s)
         pl = lcs_pl * lcsbase_pl.inverse()
         s.LinkPlacement = pl
-        doc.recompute()
+        recompute()
 
 def move_to_corrected_lcses(lcses, sensors, pl_diffs):
     for idx, lcs in enumerate(lcses):
@@ -135,62 +306,110 @@ def move_to_corrected_lcses(lcses, sensors, pl_diffs):
         lcs_corr = lcs_pl * pl_ds
         pl = lcs_corr * lcsbase_pl.inverse()
         s.LinkPlacement = pl
-        doc.recompute()
+        recompute()
 
-def move_cut_stamps(lcses, stamp, tracker_shape):
+def placed_stamps(lcses, stamp):
     try:
-        lo = stamp.getLinkedObject()
-        stamp_doc = lo.Document
-        lcsbase_pl = stamp_doc.getObjectsByLabel('LCS-Base')[0].Placement
-        shape = lo.Shape
-        temp_shape = tracker_shape
+        shape = stamp.getLinkedObject().Shape
+        lcsbase_pl = lookup().linked_placement(stamp, 'LCS-Base')
     except:
-        print("No LCS-Bae or valid shape found, aborting")
-        return
+        print("No LCS-Base or valid shape found, aborting")
+        return None
+    tools = []
     for idx, lcs in enumerate(lcses):
-        lcs_pl = lcs.Placement
-        copied_stamp = shape.copy()
-        copied_stamp.Placement = lcs_pl * lcsbase_pl.inverse()
-        temp_shape = temp_shape.cut(copied_stamp)
+        tools.append(stamp_instance(shape, lcs.Placement * lcsbase_pl.inverse()))
+    return tools
+
+# placed instance of the stamp shape sharing its geometry, only the location differs
+def stamp_instance(shape, pl, copy = False):
+    if not copy:
+        try:
+            return shape.located(pl)
+        except AttributeError: # FreeCAD older than 0.20
+            instance = shape.copy(False)
+            instance.Placement = pl
+            return instance
+    copied_stamp = shape.copy()
+    copied_stamp.Placement = pl
+    return copied_stamp
+
+# one App::Link array showing all placed stamps, instead of a document object per copy
+def show_cut_tools(lcses, stamp, simple):
+    try:
+        stamp_obj = stamp.getLinkedObject()
+        lcsbase_pl = lookup().linked_placement(stamp, 'LCS-Base')
+    except:
+        print("No LCS-Base or valid shape found, aborting")
+        return
+    name = 'cut_tools_sim' if simple else 'cut_tools'
+    if not doc.getObject(name):
+        doc.addObject('App::Link', name)
+
+    tools_obj = doc.getObject(name)
+    tools_obj.setLink(stamp_obj)
+    tools_obj.ElementCount = len(lcses)
+    tools_obj.PlacementList = [lcs.Placement * lcsbase_pl.inverse() for lcs in lcses]
+    tools_obj.Label = 'Cut tools (simple)' if simple else 'Cut tools'
+    if App.GuiUp:
+        tools_obj.ViewObject.Visibility = False
+
+# single_pass cuts all stamps with one multi-argument boolean, instead of cutting an ever-growing result once per sensor
+def move_cut_stamps(lcses, stamp, tracker_shape, single_pass = True):
+    with ins.span('place_stamps', stamps=len(lcses)):
+        tools = placed_stamps(lcses, stamp)
+    if tools is None:
+        return
+    if single_pass:
+        if not tools:
+            return tracker_shape
+        ins.count('boolean_cuts')
+        with ins.span('cut', stamps=len(tools)):
+            return tracker_shape.cut(tools)
+
+    temp_shape = tracker_shape
+    for idx, copied_stamp in enumerate(tools):
+        ins.count('boolean_cuts')
+        with ins.span('cut', sensor=idx):
+            temp_shape = temp_shape.cut(copied_stamp)
         # Part.show(temp_shape)
 
     return temp_shape
 
+# compares two cut results, shapes are considered equal if volumes, areas, bounding boxes and symmetric difference match within tolerance
+def same_cut_shapes(shape_a, shape_b, tol = 1e-6):
+    if len(shape_a.Solids) != len(shape_b.Solids):
+        print ('Different number of solids: ' + str(len(shape_a.Solids)) + ' ' + str(len(shape_b.Solids)))
+        return False
+    vol_tol = tol * max(shape_a.Volume, 1.0)
+    vol_diff = abs(shape_a.Volume - shape_b.Volume)
+    area_diff = abs(shape_a.Area - shape_b.Area)
+    if vol_diff > vol_tol or area_diff > tol * max(shape_a.Area, 1.0):
+        print ('Volume difference: ' + str(vol_diff) + ', area difference: ' + str(area_diff))
+        return False
+    bb_a = shape_a.BoundBox
+    bb_b = shape_b.BoundBox
+    bb_diff = max(abs(bb_a.XMin - bb_b.XMin), abs(bb_a.YMin - bb_b.YMin), abs(bb_a.ZMin - bb_b.ZMin),
+                  abs(bb_a.XMax - bb_b.XMax), abs(bb_a.YMax - bb_b.YMax), abs(bb_a.ZMax - bb_b.ZMax))
+    if bb_diff > tol * max(bb_a.DiagonalLength, 1.0):
+        print ('Bounding boxes difference: ' + str(bb_diff))
+        return False
+    sym_diff = shape_a.cut(shape_b).Volume + shape_b.cut(shape_a).Volume
+    if sym_diff > vol_tol:
+        print ('Symmetric difference volume: ' + str(sym_diff))
+        return False
+    return True
+
 def find_sensor_lcs_pl_corr(lcses, sensors): # if user corrected the sensor placement by hand after alignment, there will be placement difference beetween sensor and LCS placed on tracker shape
     pl_ds = []
-    for idx, lcs in enumerate(lcses):
-        s = sensors[idx]
-        lcs_pl = lcs.Placement
-        link_pl, lcsbase_pl = find_pl(s)
-        total_pl = link_pl * lcsbase_pl
-        pl_t = lcs_pl.inverse() * total_pl
+    lcs_mats = pm.from_placements([lcs.Placement for lcs in lcses])
+    diff_mats = pm.compose(pm.invert(lcs_mats), sensor_base_matrices(sensors[:len(lcses)]))
+    for idx, diff_mat in enumerate(diff_mats):
+        pl_t = matrix_placement(diff_mat)
         print ('Sensor and LCS ' + str(idx) + ' placement difference: ' + str (pl_t))
         pl_ds.append(pl_t)
     return pl_ds
 
-# places sensors (relative to ther base LCS-es) on nearest surface
-# then cuts material with stamp model to get flat (or other required shape) surface to mount sensor
-
-def place_cut_sensors(simple = False):
-    try:
-        tracker_obj = doc.getObjectsByLabel(tracker_base_label)[0]
-        tracker_shape = tracker_obj.Shape
-    except:
-        print("No valid tracker shape found, aborting")
-        return
-    try:
-        if simple:
-            stamp = doc.getObjectsByLabel(stamp_simple_label)[0]
-        else:
-            stamp = doc.getObjectsByLabel(stamp_label)[0]
-    except:
-        print("No stamp found, aborting")
-        return
-    sensors = doc.findObjects(Label=sensor_label)
-    lcses = create_lcses_sensors(sensors, tracker_shape)
-    move_to_lcses(lcses, sensors)
-
-    cut_shape = move_cut_stamps(lcses, stamp, tracker_shape)
+def show_cut_shape(cut_shape, tracker_obj, simple):
     if simple:
         if not doc.getObject('cut_obj_sim'):
             doc.addObject("Part::Feature", 'cut_obj_sim')
@@ -199,8 +418,9 @@ def place_cut_sensors(simple = False):
         c_objsim.Shape = cut_shape
         c_objsim.Label = 'Tracker edited (simple)'
 
-        tracker_obj.ViewObject.Visibility = False
-        c_objsim.ViewObject.Transparency = 50
+        if App.GuiUp:
+            tracker_obj.ViewObject.Visibility = False
+            c_objsim.ViewObject.Transparency = 50
     else:
         if not doc.getObject('cut_obj'):
             doc.addObject("Part::Feature", 'cut_obj')
@@ -209,57 +429,287 @@ def place_cut_sensors(simple = False):
         c_obj.Shape = cut_shape
         c_obj.Label = 'Tracker edited'
 
-        tracker_obj.ViewObject.Visibility = False
-        c_obj.ViewObject.Transparency = 50
+        if App.GuiUp:
+            tracker_obj.ViewObject.Visibility = False
+            c_obj.ViewObject.Transparency = 50
 
-# after sensor placement modification by user, new surfaces for placing sensors are needed
-def recut_sensors(simple = False):
+# places sensors (relative to ther base LCS-es) on nearest surface
+# then cuts material with stamp model to get flat (or other required shape) surface to mount sensor
+
+@ins.traced()
+@batched('Place and cut sensors')
+def place_cut_sensors(simple = False, check = True):
     try:
-        tracker_obj = doc.getObjectsByLabel(tracker_base_label)[0]
+        tracker_obj = lookup().objects_by_label(tracker_base_label)[0]
         tracker_shape = tracker_obj.Shape
     except:
         print("No valid tracker shape found, aborting")
         return
     try:
         if simple:
-            stamp = doc.getObjectsByLabel(stamp_simple_label)[0]
+            stamp = lookup().objects_by_label(stamp_simple_label)[0]
         else:
-            stamp = doc.getObjectsByLabel(stamp_label)[0]
+            stamp = lookup().objects_by_label(stamp_label)[0]
     except:
         print("No stamp found, aborting")
         return
-    lcses = doc.findObjects(Label='s_lcs')
-    sensors = doc.findObjects(Label=sensor_label)
-
-    for idx,s in enumerate(sensors):
-        link_pl, lcsbase_pl = find_pl(s)
-        total_pl = link_pl * lcsbase_pl
-        lcses[idx].Placement = total_pl
+    sensors = lookup().find_objects(sensor_label)
+    lcses = create_lcses_sensors(sensors, tracker_shape)
+    with ins.span('move_sensors'):
+        move_to_lcses(lcses, sensors)
 
     cut_shape = move_cut_stamps(lcses, stamp, tracker_shape)
+    with ins.span('show'):
+        show_cut_shape(cut_shape, tracker_obj, simple)
+        show_cut_tools(lcses, stamp, simple)
+    if check and auto_clearance:
+        check_clearance(cut_shape)
+
+placement_tol = 1e-7
+recut_cache = {} # last cut for every stamp variant: stamp, base shape, placed stamps and result, used by incremental recut
+
+def same_placement(pl_a, pl_b, tol = placement_tol):
+    return (pl_a.Base - pl_b.Base).Length <= tol and pl_a.Rotation.isSame(pl_b.Rotation, tol)
+
+# re-cuts only stamps whose placement changed since the last incremental recut:
+# material removed by old stamps is restored from the base, then new stamps (and unchanged stamps overlapping restored regions) are cut again
+def incremental_cut(simple, stamp, tracker_shape, lcses):
+    tools = placed_stamps(lcses, stamp)
+    if tools is None:
+        return
+    stamp_shape = stamp.getLinkedObject().Shape
+    state = recut_cache.get(simple)
+    if (state is None or state['stamp'] != stamp.Name or not state['stamp_shape'].isPartner(stamp_shape)
+            or not state['base'].isPartner(tracker_shape) or len(state['tools']) != len(tools)):
+        print ('Incremental recut: no matching previous cut, cutting all stamps')
+        ins.count('boolean_cuts')
+        with ins.span('cut', stamps=len(tools)):
+            cut_shape = tracker_shape.cut(tools) if tools else tracker_shape
+    else:
+        changed = [idx for idx, tool in enumerate(tools) if not same_placement(tool.Placement, state['tools'][idx].Placement)]
+        print ('Incremental recut: ' + str(len(changed)) + ' of ' + str(len(tools)) + ' stamps changed')
+        cut_shape = state['shape']
+        if changed:
+            patches = [tracker_shape.common(state['tools'][idx]) for idx in changed]
+            recut = [tools[idx] for idx in changed]
+            for idx, tool in enumerate(tools):
+                if idx not in changed and any(tool.BoundBox.intersect(patch.BoundBox) for patch in patches):
+                    recut.append(tool)
+            ins.count('boolean_cuts')
+            with ins.span('incremental_cut', changed=len(changed), recut=len(recut)):
+                cut_shape = cut_shape.fuse(patches).cut(recut).removeSplitter()
+    recut_cache[simple] = {'stamp': stamp.Name, 'stamp_shape': stamp_shape, 'base': tracker_shape, 'tools': tools, 'shape': cut_shape}
+    return cut_shape
 
-    if simple:
-        if not doc.getObject('cut_obj_sim'):
-            doc.addObject("Part::Feature", 'cut_obj_sim')
+# after sensor placement modification by user, new surfaces for placing sensors are needed
+# incremental only writes changed s_lcs placements and re-cuts regions of sensors moved since the previous incremental recut
+@ins.traced()
+@batched('Recut sensors')
+def recut_sensors(simple = False, incremental = False, check = True):
+    try:
+        tracker_obj = lookup().objects_by_label(tracker_base_label)[0]
+        tracker_shape = tracker_obj.Shape
+    except:
+        print("No valid tracker shape found, aborting")
+        return
+    try:
+        if simple:
+            stamp = lookup().objects_by_label(stamp_simple_label)[0]
+        else:
+            stamp = lookup().objects_by_label(stamp_label)[0]
+    except:
+        print("No stamp found, aborting")
+        return
+    sensors = lookup().find_objects(sensor_label)
+    pairs = []
+    for s, lcs in zip(sensors, lookup().sensor_lcses(sensors)):
+        if lcs:
+            pairs.append((s, lcs))
+        else:
+            print ('No s_lcs for ' + s.Label + ', not cut')
+    lcses = [lcs for _, lcs in pairs] # s_lcs-es left from removed sensors aren't cut
 
-        c_objsim = doc.getObject('cut_obj_sim')
-        c_objsim.Shape = cut_shape
-        c_objsim.Label = 'Tracker edited (simple)'
+    for lcs, total_mat in zip(lcses, sensor_base_matrices([s for s, _ in pairs])):
+        total_pl = matrix_placement(total_mat)
+        if not incremental or not same_placement(lcs.Placement, total_pl):
+            lcs.Placement = total_pl
 
-        tracker_obj.ViewObject.Visibility = False
-        c_objsim.ViewObject.Transparency = 50
+    if incremental:
+        cut_shape = incremental_cut(simple, stamp, tracker_shape, lcses)
     else:
-        if not doc.getObject('cut_obj'):
-            doc.addObject("Part::Feature", 'cut_obj')
-
-        c_obj = doc.getObject('cut_obj')
-        c_obj.Shape = cut_shape
-        c_obj.Label = 'Tracker edited'
-
-        tracker_obj.ViewObject.Visibility = False
-        c_obj.ViewObject.Transparency = 50
+        cut_shape = move_cut_stamps(lcses, stamp, tracker_shape)
+    with ins.span('show'):
+        show_cut_shape(cut_shape, tracker_obj, simple)
+        show_cut_tools(lcses, stamp, simple)
+    if check and auto_clearance:
+        check_clearance(cut_shape)
+
+full_cut_job = None # running background full cut, see start_full_cut()
+full_cut_timer = None
+full_cut_poll_ms = 200
+
+# simplified cut for immediate feedback, then the full "stamp" cut runs in a FreeCADCmd process (see background_cut.py)
+# and replaces "Tracker edited" when done. Moving a sensor or an s_lcs or starting a new progressive cut cancels the running one.
+# Clearance is checked only on the full cut.
+# recut=True starts from recut_sensors() (keeps manual placement changes) instead of place_cut_sensors()
+def place_cut_sensors_progressive(recut = False):
+    cancel_full_cut()
+    if recut:
+        recut_sensors(True, check=False)
+    else:
+        place_cut_sensors(True, check=False)
+    start_full_cut()
 
-def write_sensors_spreadsheet(spr, pl_ds):
+def start_full_cut():
+    global full_cut_job, full_cut_timer
+    cancel_full_cut()
+    try:
+        tracker_obj = lookup().objects_by_label(tracker_base_label)[0]
+        stamp = lookup().objects_by_label(stamp_label)[0]
+    except:
+        print("No valid tracker shape or stamp found, aborting")
+        return
+    lcses = lookup().find_objects('s_lcs')
+    tools = placed_stamps(lcses, stamp)
+    if tools is None:
+        return
+    try:
+        with ins.span('full_cut_start', stamps=len(tools)):
+            job = background_cut.CutJob(tracker_obj.Shape, tools, job_placements(lcses))
+    except Exception as e:
+        print("Background cut not started: " + str(e) + ", aborting")
+        return
+    full_cut_job = job
+    print ('Full cut of ' + str(len(tools)) + ' stamps started in background')
+    if App.GuiUp:
+        if full_cut_timer is None:
+            from PySide2 import QtCore
+            full_cut_timer = QtCore.QTimer()
+            full_cut_timer.setInterval(full_cut_poll_ms)
+            full_cut_timer.timeout.connect(poll_full_cut)
+        full_cut_timer.start()
+
+def cancel_full_cut():
+    global full_cut_job
+    if full_cut_job is None:
+        return
+    full_cut_job.cancel()
+    full_cut_job = None
+    if full_cut_timer:
+        full_cut_timer.stop()
+    print ('Full cut cancelled')
+
+# sensor and s_lcs placements a full cut is computed for, stamps are placed on s_lcs-es
+def job_placements(lcses):
+    placements = {s.Name: s.LinkPlacement for s in lookup().find_objects(sensor_label)}
+    placements.update((lcs.Name, lcs.Placement) for lcs in lcses)
+    return placements
+
+# sensors or s_lcs-es moved (eg. by hand, recut_sensors() or load_corr()), added or removed since the job started
+def placements_changed(job):
+    current = job_placements(lookup().find_objects('s_lcs'))
+    if set(current) != set(job.placements):
+        return True
+    return any(not same_placement(pl, job.placements[name]) for name, pl in current.items())
+
+# called by the timer in the GUI, returns True when the job is finished (or there is none)
+def poll_full_cut():
+    global full_cut_job
+    job = full_cut_job
+    if job is None:
+        return True
+    if placements_changed(job):
+        cancel_full_cut()
+        return True
+    if not job.done():
+        return False
+    full_cut_job = None
+    if full_cut_timer:
+        full_cut_timer.stop()
+    cut_shape = job.result()
+    report = job.report()
+    elapsed = job.elapsed()
+    job.cleanup()
+    if cut_shape is None:
+        print ('Full cut failed: ' + report['error'])
+        return True
+    print ('Full cut done in ' + str(round(elapsed, 2)) + ' s')
+    apply_full_cut(cut_shape)
+    return True
+
+@batched('Full cut')
+def apply_full_cut(cut_shape):
+    tracker_obj = lookup().objects_by_label(tracker_base_label)[0]
+    stamp = lookup().objects_by_label(stamp_label)[0]
+    with ins.span('show'):
+        show_cut_shape(cut_shape, tracker_obj, False)
+        show_cut_tools(lookup().find_objects('s_lcs'), stamp, False)
+    if auto_clearance:
+        check_clearance(cut_shape)
+
+# blocks until the background full cut is done, without the GUI there is no timer polling it
+def wait_full_cut(timeout = None):
+    t0 = time.perf_counter()
+    while not poll_full_cut():
+        if timeout is not None and time.perf_counter() - t0 > timeout:
+            cancel_full_cut()
+            return
+        time.sleep(full_cut_poll_ms / 1000.0)
+
+# red lines between the closest points of violating pairs and under thin walls, in "Clearance" group (replaced on every check)
+def show_clearance(violations):
+    group = doc.getObject('ClearanceGroup')
+    if group:
+        for obj in group.Group:
+            doc.removeObject(obj.Name)
+    elif violations:
+        group = doc.addObject('App::DocumentObjectGroup', 'ClearanceGroup')
+        group.Label = 'Clearance'
+    for idx, v in enumerate(violations):
+        a, b = v['points']
+        if (a - b).Length < 1e-6: # touching shapes or a wall, show a short mark along z
+            b = a + App.Vector(0, 0, 1)
+        marker = doc.addObject('Part::Feature', 'clearance' + str(idx))
+        marker.Shape = Part.makeLine(a, b)
+        marker.Label = 'clearance ' + v['type'] + ' ' + str(idx) # object labels go to Label2, sensor labels would match sensor_label
+        marker.Label2 = v['a'] + (' - ' + v['b'] if v['b'] else '') + ': ' + str(round(v['distance'], 3)) + ' mm'
+        group.addObject(marker)
+        if App.GuiUp:
+            marker.ViewObject.LineColor = (1.0, 0.0, 0.0)
+            marker.ViewObject.LineWidth = 4.0
+    if App.GuiUp and violations:
+        Gui.Selection.clearSelection()
+        for v in violations:
+            for label in (v['a'], v['b']):
+                for obj in lookup().objects_by_label(label) if label else []:
+                    Gui.Selection.addSelection(obj)
+
+# gaps between sensors and between sensors and the mainboard below min_gap, walls under stamps thinner than min_wall
+# cut_shape defaults to "Tracker edited", wall thickness isn't checked without it
+@ins.traced()
+def check_clearance(cut_shape = None, min_gap = clearance.min_gap, min_wall = clearance.min_wall, highlight = True):
+    sensors = lookup().find_objects(sensor_label)
+    items = [(s.Label, Part.getShape(s), 'sensor') for s in sensors]
+    for mb in lookup().objects_by_label(mainboard_label):
+        items.append((mb.Label, Part.getShape(mb), 'mainboard'))
+    violations, candidates, exact = clearance.check_gaps(items, min_gap)
+
+    if cut_shape is None and doc.getObject('cut_obj'):
+        cut_shape = doc.getObject('cut_obj').Shape
+    if cut_shape is not None:
+        pairs = [(s, lcs) for s, lcs in zip(sensors, lookup().sensor_lcses(sensors)) if lcs]
+        points = [lcs.Placement.Base for _, lcs in pairs]
+        normals = [lcs.Placement.Rotation.multVec(App.Vector(0, 0, 1)) for _, lcs in pairs]
+        violations += clearance.check_walls(cut_shape, [s.Label for s, _ in pairs], points, normals, min_wall)
+    ins.count('clearance_candidates', candidates)
+    ins.count('clearance_exact', exact)
+    print ('Clearance: ' + str(len(items)) + ' objects, ' + str(candidates) + ' candidate pairs, ' + str(exact) + ' exact checks')
+    clearance.print_violations(violations)
+    if highlight:
+        show_clearance(violations)
+    return violations
+
+def write_sensors_spreadsheet(spr, pl_ds, names = None):
     for idx, pl in enumerate(pl_ds):
         cell_i = str(idx + 2)
         spr.set('A' + cell_i, str(pl.Base.x))
@@ -269,11 +719,29 @@ def write_sensors_spreadsheet(spr, pl_ds):
         spr.set('E' + cell_i, str(pl.Rotation.Axis.x))
         spr.set('F' + cell_i, str(pl.Rotation.Axis.y))
         spr.set('G' + cell_i, str(pl.Rotation.Axis.z))
-        doc.recompute()
+        if names:
+            spr.set('H' + cell_i, names[idx])
+    recompute()
 
+# rows are matched to sensors by names in column H when it's filled (written by export_corr_spreadsheet()), by order otherwise
 def read_sensors_spreadsheet(spr, sens):
+    rows = {}
+    idx = 0
+    while True:
+        cell_i = str(idx + 2)
+        try:
+            name = spr.get('H' + cell_i)
+        except: # empty cell
+            break
+        rows[name] = idx
+        idx += 1
     ret_pl = []
     for idx, s in enumerate(sens):
+        if rows:
+            if s.Name not in rows:
+                ret_pl.append(None)
+                continue
+            idx = rows[s.Name]
         cell_i = str(idx + 2)
         x = spr.get('A' + cell_i)
         y = spr.get('B' + cell_i)
@@ -286,39 +754,244 @@ def read_sensors_spreadsheet(spr, sens):
         ret_pl.append(pl)
     return ret_pl
 
-# if user correcter sensor placement by hand, this will save it in a spreadsheet
-def save_corr():
-    lcses = doc.findObjects(Label='s_lcs')
-    sensors = doc.findObjects(Label=sensor_label)
-    if not doc.getObject('SensorSpreadsheet'):
-        doc.addObject('Spreadsheet::Sheet','SensorSpreadsheet')
-
-    spr_obj = doc.getObject('SensorSpreadsheet')
-    spr_obj.set('A1', 'X')
-    spr_obj.set('B1', 'Y')
-    spr_obj.set('C1', 'Z')
-    spr_obj.set('D1', 'angle')
-    spr_obj.set('E1', 'axis X')
-    spr_obj.set('F1', 'axis Y')
-    spr_obj.set('G1', 'axis Z')
-    pl_diffs = find_sensor_lcs_pl_corr(lcses, sensors)
-    print (pl_diffs)
-    write_sensors_spreadsheet(spr_obj, pl_diffs)
-
-# loads drom spreadsheet corrected placement by user
+corr_spreadsheet = 'SensorSpreadsheet'
+
+# spreadsheet with corrections by its name or label, None if missing
+def find_spreadsheet(name):
+    spr_obj = doc.getObject(name)
+    if not spr_obj:
+        found = lookup().objects_by_label(name)
+        spr_obj = found[0] if found else None
+    return spr_obj
+
+# correction set in the store or (older documents) a spreadsheet with this name
+def corr_exists(name = corr_store.default_set):
+    return corr_store.has_set(doc, name) or find_spreadsheet(name) is not None
+
+# spreadsheet view of a correction set, rows in sensor order with sensor names in column H
+def export_corr_spreadsheet(name = corr_store.default_set, spreadsheet = corr_spreadsheet):
+    corrections = corr_store.read_set(doc, name)
+    if corrections is None:
+        print ('Correction set ' + name + ' not found, aborting')
+        return
+    spr_obj = find_spreadsheet(spreadsheet)
+    if not spr_obj:
+        spr_obj = doc.addObject('Spreadsheet::Sheet', spreadsheet)
+    for col, title in zip('ABCDEFGH', ['X', 'Y', 'Z', 'angle', 'axis X', 'axis Y', 'axis Z', 'sensor']):
+        spr_obj.set(col + '1', title)
+    names = [s.Name for s in lookup().find_objects(sensor_label) if s.Name in corrections]
+    write_sensors_spreadsheet(spr_obj, [corrections[key] for key in names], names)
+
+# if user corrected sensor placement by hand, this will save it as a correction set (one bulk write, see correction_store.py)
+# several correction sets can be kept with different names, spreadsheet also exports the set into a spreadsheet
+@ins.traced()
+@batched('Save sensor corrections')
+def save_corr(name = corr_store.default_set, spreadsheet = None):
+    sensors = lookup().find_objects(sensor_label)
+    pairs = [(s, lcs) for s, lcs in zip(sensors, lookup().sensor_lcses(sensors)) if lcs]
+    pl_diffs = find_sensor_lcs_pl_corr([lcs for _, lcs in pairs], [s for s, _ in pairs])
+    corr_store.write_set(doc, name, {s.Name: pl for (s, _), pl in zip(pairs, pl_diffs)})
+    print ('Saved ' + str(len(pl_diffs)) + ' corrections as set ' + name)
+    if spreadsheet:
+        export_corr_spreadsheet(name, spreadsheet)
+
+# loads a correction set saved with save_corr(), corrections are matched to sensors by object name
+# and every sensor is moved relative to its own s_lcs (see DocIndex.sensor_lcses())
+# older documents without the set are read from a spreadsheet of the same name (SensorSpreadsheet for the default set)
 # if tracker shape changed sensor will follow the change and then apply the correction
-def load_corr():
-    lcses = doc.findObjects(Label='s_lcs')
-    sensors = doc.findObjects(Label=sensor_label)
-    if not doc.getObject('SensorSpreadsheet'):
-        print ('Spreadsheet not found!')
+@ins.traced()
+@batched('Load sensor corrections')
+def load_corr(name = corr_store.default_set):
+    sensors = lookup().find_objects(sensor_label)
+    corrections = corr_store.read_set(doc, name)
+    if corrections is None:
+        spr_obj = find_spreadsheet(name) or (name == corr_store.default_set and find_spreadsheet(corr_spreadsheet))
+        if not spr_obj:
+            print ('Correction set ' + name + ' not found!')
+            return
+        corrections = {s.Name: pl for s, pl in zip(sensors, read_sensors_spreadsheet(spr_obj, sensors)) if pl is not None}
+    lcses = []
+    moved = []
+    pl_diffs = []
+    for s, lcs in zip(sensors, lookup().sensor_lcses(sensors)):
+        if lcs is None:
+            print ('No s_lcs for ' + s.Label + ', correction not applied')
+            continue
+        if s.Name not in corrections:
+            print ('No correction for ' + s.Label + ', placed on its LCS')
+        lcses.append(lcs)
+        moved.append(s)
+        pl_diffs.append(corrections.get(s.Name, App.Placement()))
+    unused = len(set(corrections) - set(s.Name for s in sensors))
+    if unused:
+        print (str(unused) + ' corrections of removed sensors ignored')
+    move_to_corrected_lcses(lcses, moved, pl_diffs)
+
+# checks if single pass cut gives the same shape as cutting stamps one by one, on current s_lcs placements
+def check_single_pass_cut(simple = False):
+    try:
+        tracker_shape = lookup().objects_by_label(tracker_base_label)[0].Shape
+        stamp = lookup().objects_by_label(stamp_simple_label if simple else stamp_label)[0]
+    except:
+        print("No valid tracker shape or stamp found, aborting")
+        return
+    lcses = lookup().find_objects('s_lcs')
+    t0 = time.perf_counter()
+    sequential = move_cut_stamps(lcses, stamp, tracker_shape, False)
+    t1 = time.perf_counter()
+    single = move_cut_stamps(lcses, stamp, tracker_shape)
+    t2 = time.perf_counter()
+    print ('Sequential cut: ' + str(round(t1 - t0, 3)) + ' s, single pass cut: ' + str(round(t2 - t1, 3)) + ' s')
+    same = same_cut_shapes(sequential, single)
+    print ('Cut results match' if same else 'Cut results differ!')
+    return same
+
+# placement on the surface point, Z axis along the normal, X axis towards dir - the same as LCS-es attached in create_lcses_sensors()
+def surface_placement(point, normal, dir):
+    z = np.array([normal.x, normal.y, normal.z])
+    z = z / np.linalg.norm(z)
+    x = np.array([dir.x, dir.y, dir.z])
+    x = x - np.dot(x, z) * z
+    if np.linalg.norm(x) < 1e-9: # dir parallel to the normal, any perpendicular axis will do
+        x = np.cross(z, [1.0, 0.0, 0.0]) if abs(z[0]) < 0.9 else np.cross(z, [0.0, 1.0, 0.0])
+    x = x / np.linalg.norm(x)
+    mat = np.eye(4)
+    mat[:3, 0] = x
+    mat[:3, 1] = np.cross(z, x)
+    mat[:3, 2] = z
+    mat[:3, 3] = (point.x, point.y, point.z)
+    return matrix_placement(mat)
+
+def tessellate(shape, tolerance):
+    mesh_pts, mesh_tris = shape.tessellate(tolerance)
+    return np.array([(p.x, p.y, p.z) for p in mesh_pts]).reshape(-1, 3), np.array(mesh_tris, dtype=np.int64).reshape(-1, 3)
+
+# searches sensor positions on the tracker surface for the best coverage and pose observability (see placement_optimizer.py)
+# candidate sites are sampled from the tracker tessellation and projected on the surface with find_points_normals(),
+# sites inside keep-outs are skipped. Sensors are moved to the found sites and s_lcs LCS-es are recreated, so recut_sensors()
+# and sensor-extraction.py work as usual. Options (eg. min_spacing, min_visible, max_rounds) are passed to the optimizer.
+@batched('Optimize sensors')
+def optimize_sensors(n_sites = 2000, tessellation = 1.0, processes = None, **options):
+    import placement_optimizer
+    try:
+        tracker_obj = lookup().objects_by_label(tracker_base_label)[0]
+        tracker_shape = tracker_obj.Shape
+    except:
+        print("No valid tracker shape found, aborting")
+        return
+    sensors = lookup().find_objects(sensor_label)
+    names = ('tess_points_' + str(tessellation), 'tess_triangles_' + str(tessellation))
+    vertices, faces = geometry_cache.cached(geometry_cache.shape_key(tracker_shape), names, lambda: tessellate(tracker_shape, tessellation))
+    tris = vertices[faces]
+    areas = np.linalg.norm(np.cross(tris[:, 1] - tris[:, 0], tris[:, 2] - tris[:, 0]), axis=1)
+    nonzero = np.nonzero(areas > 0.0)[0]
+    rng = np.random.default_rng(0)
+    picked = rng.choice(nonzero, size=min(n_sites, len(nonzero)), replace=False, p=areas[nonzero] / areas[nonzero].sum())
+    positions = [App.Vector(*c) for c in tris[picked].mean(axis=1).tolist()]
+    # current sensor positions are candidate sites too, they are the initial layout
+    positions += [App.Vector(*pm.positions(m).tolist()) for m in sensor_base_matrices(sensors)]
+    points_normals = find_points_normals(tracker_shape, positions)
+    sites = np.array([(p.x, p.y, p.z) for p, n in points_normals])
+    normals = np.array([(n.x, n.y, n.z) for p, n in points_normals])
+
+    allowed = np.ones(len(sites), dtype=bool)
+    for label in keepout_labels:
+        for obj in lookup().objects_by_label(label):
+            bb = obj.Shape.BoundBox
+            bb.enlarge(keepout_margin)
+            inside = ((sites[:, 0] >= bb.XMin) & (sites[:, 0] <= bb.XMax) & (sites[:, 1] >= bb.YMin) & (sites[:, 1] <= bb.YMax)
+                      & (sites[:, 2] >= bb.ZMin) & (sites[:, 2] <= bb.ZMax))
+            allowed &= ~inside
+    initial = np.arange(len(picked), len(sites))
+    layout, score, history = placement_optimizer.optimize_layout(sites, normals, initial, allowed, (vertices, faces), processes, **options)
+    print ('Optimized score: ' + str(round(history[0], 4)) + ' -> ' + str(round(score, 4)))
+
+    mb_link_pl, _ = find_mainboard_imu_pl()
+    dir = mb_link_pl.Rotation * initial_dir
+    for idx, s in enumerate(sensors):
+        point, normal = points_normals[layout[idx]]
+        link_pl, lcsbase_pl = find_pl(s)
+        s.LinkPlacement = surface_placement(point, normal, dir) * lcsbase_pl.inverse()
+    lcses = create_lcses_sensors(sensors, tracker_shape)
+    move_to_lcses(lcses, sensors)
+    return layout, score
+
+# compares find_points_normals() with the brute force find_point_normal() loop on current sensors positions
+def bench_find_point_normal():
+    try:
+        tracker_shape = lookup().objects_by_label(tracker_base_label)[0].Shape
+    except:
+        print("No valid tracker shape found, aborting")
         return
-    spr_obj = doc.getObject('SensorSpreadsheet')
-    pl_diffs = read_sensors_spreadsheet(spr_obj, sensors)
-    if len(lcses) != len(pl_diffs):
-        print ('Number of corrected placements and sensors LCS-es not equal!')
+    positions = []
+    for s in lookup().find_objects(sensor_label):
+        link_pl, lcsbase_pl = find_pl(s)
+        positions.append((link_pl * lcsbase_pl).Base)
+
+    t0 = time.perf_counter()
+    brute = [find_point_normal(tracker_shape, pos) for pos in positions]
+    t1 = time.perf_counter()
+    indexed = find_points_normals(tracker_shape, positions)
+    t2 = time.perf_counter()
+
+    max_diff = 0.0
+    for (bp, bn), (ip, inorm) in zip(brute, indexed):
+        max_diff = max(max_diff, (bp - ip).Length, (bn - inorm).Length)
+    print ('Faces: ' + str(len(build_face_index(tracker_shape)[0])) + ', sensors: ' + str(len(positions)))
+    print ('Brute force: ' + str(round(t1 - t0, 3)) + ' s, indexed: ' + str(round(t2 - t1, 3)) + ' s')
+    print ('Max point/normal difference: ' + str(max_diff))
+
+# writes "Tracker edited (simple)" as simulation mesh (.scad and/or .stl), fine around sensor apertures (see sim_export.py)
+# simple=False exports "Tracker edited" instead
+def export_sim(scad_path = None, stl_path = None, simple = True, **options):
+    cut_obj = doc.getObject('cut_obj_sim' if simple else 'cut_obj')
+    if not cut_obj:
+        print("No cut shape found, run place_cut_sensors(" + str(simple) + ") first, aborting")
+        return
+    if not scad_path and not stl_path:
+        if not App.GuiUp:
+            print("No output file given, aborting")
+            return
+        from PySide2 import QtWidgets
+        scad_path, _ = QtWidgets.QFileDialog.getSaveFileName(QtWidgets.QApplication.activeWindow(), "Export simulation mesh", "", "OpenSCAD (*.scad);;STL (*.stl)")
+        if scad_path == "":
+            return
+        if scad_path.lower().endswith('.stl'):
+            scad_path, stl_path = None, scad_path
+    sensor_points = [tuple(lcs.Placement.Base) for lcs in lookup().find_objects('s_lcs')]
+    with ins.span('export_sim'):
+        report = sim_export.export_mesh(cut_obj.Shape, sensor_points, scad_path, stl_path, **options)
+    sim_export.print_report(report)
+    return report
+
+# compares stamp copies with shared geometry instances: setup time, memory held by placed stamps and cut time
+# process peak RSS only grows, so the instances line shows the peak of both runs
+def bench_stamp_instancing(simple = False):
+    try:
+        tracker_shape = lookup().objects_by_label(tracker_base_label)[0].Shape
+        stamp = lookup().objects_by_label(stamp_simple_label if simple else stamp_label)[0]
+        shape = stamp.getLinkedObject().Shape
+        lcsbase_pl = lookup().linked_placement(stamp, 'LCS-Base')
+    except:
+        print("No valid tracker shape or stamp found, aborting")
         return
-    move_to_corrected_lcses(lcses, sensors, pl_diffs)
+    pls = [lcs.Placement * lcsbase_pl.inverse() for lcs in lookup().find_objects('s_lcs')]
+    results = []
+    for copy in (True, False):
+        gc.collect()
+        rss0 = ins.rss_mb()
+        t0 = time.perf_counter()
+        tools = [stamp_instance(shape, pl, copy) for pl in pls]
+        t1 = time.perf_counter()
+        rss1 = ins.rss_mb()
+        cut_shape = tracker_shape.cut(tools) if tools else tracker_shape
+        t2 = time.perf_counter()
+        print (('Copies' if copy else 'Instances') + ': setup ' + str(round(t1 - t0, 4)) + ' s, cut ' + str(round(t2 - t1, 3))
+               + ' s, placed stamps memory ' + str(round(rss1 - rss0, 2)) + ' MB, RSS after cut ' + str(round(ins.rss_mb(), 1))
+               + ' MB, process peak RSS ' + str(round(ins.peak_mb(), 1)) + ' MB')
+        results.append(cut_shape)
+        del tools
+    print ('Stamps: ' + str(len(pls)) + ', same result: ' + str(same_cut_shapes(results[0], results[1])))
 
 #place_cut_sensors()
 #save_corr()
@@ -5,8 +5,21 @@
 # "sensor" (imported as App::Link) should have "LCS-Diode" LCS that is placed in the center of photodiode
 # "tracker-mainboard" (imported as App::Link) needs "LCS_IMU" for IMU (inertial measurement unit) placement
 
+import os
+import sys
 import FreeCAD as App
-from PySide2 import QtWidgets
+if App.GuiUp:
+    from PySide2 import QtWidgets
+try:
+    scripts_dir = os.path.dirname(os.path.abspath(__file__))
+    if scripts_dir not in sys.path:
+        sys.path.append(scripts_dir)
+except NameError: # pasted into the Python console, freecad-scripts directory has to be in sys.path already
+    pass
+import placement_math as pm
+import tracker_config as tc
+import doc_index
+import instrumentation as ins
 
 sensor_label = 'sensor'
 tracker_base_label = 'tracker-base'
@@ -14,25 +27,42 @@ mainboard_label = 'tracker-mainboard'
 
 doc = App.ActiveDocument
 
-def find_diode_pl(s):
+# switches the document used for extraction, used when the script is loaded headless (see tracker_batch.py)
+def set_document(new_doc):
+    global doc
+    doc = new_doc
+
+# returns link placement and LCS-Diode placement (relative to the sensor model) of a sensor
+def find_diode_pls(s):
     link_pl = s.LinkPlacement
-    s_doc = s.getLinkedObject().Document
     try:
-        lcsdiode_pl = s_doc.getObjectsByLabel('LCS-Diode')[0].Placement
+        lcsdiode_pl = doc_index.get_index(doc).linked_placement(s, 'LCS-Diode')
     except:
         print("No LCS-Diode found, aborting")
+        return None, None
+    return link_pl, lcsdiode_pl
+
+def find_diode_pl(s):
+    link_pl, lcsdiode_pl = find_diode_pls(s)
+    if not link_pl:
         return None
     lcsdiode_global_pl = link_pl * lcsdiode_pl
     return lcsdiode_global_pl
 
-def find_imu_pl():
+# returns mainboard link placement and LCS-IMU placement (relative to the mainboard model)
+def find_imu_pls():
     try:
-        mb = doc.getObjectsByLabel(mainboard_label)[0]
+        mb = doc_index.get_index(doc).objects_by_label(mainboard_label)[0]
         link_pl = mb.LinkPlacement
-        mb_doc = mb.getLinkedObject().Document
-        lcsimu_pl = mb_doc.getObjectsByLabel('LCS-IMU')[0].Placement
+        lcsimu_pl = doc_index.get_index(doc).linked_placement(mb, 'LCS-IMU')
     except:
         print(mainboard_label + "not found or does not contain LCS-IMU")
+        return None, None
+    return link_pl, lcsimu_pl
+
+def find_imu_pl():
+    link_pl, lcsimu_pl = find_imu_pls()
+    if not link_pl:
         return None
     lcsimu_global_pl = link_pl * lcsimu_pl
     return lcsimu_global_pl
@@ -42,163 +72,52 @@ def save_json():
     if filename =="":
         return
     print ("Saving: " + filename)
-    json = get_json()
-    outfile = open(filename,"w")
-    outfile.write(json)
-    outfile.close()
-
-def get_json():
-    channelMap = ""
-    modelNormals = ""
-    modelPoints = ""
-    imuPosition = ""
-    imuPlusX = ""
-    imuPlusZ = ""
     try:
-        sensors = doc.findObjects(Label=sensor_label)
-        for idx,sens in enumerate(sensors):
-            diode_pl = find_diode_pl(sens)
-            if diode_pl:
-                base_vec = diode_pl.Base
-                mat = diode_pl.Matrix
-                normal_vec = App.Vector(mat.A13, mat.A23, mat.A33)
-                if (idx  > 0):
-                    channelMap = channelMap + ", "
-                    modelNormals = modelNormals + ",\n"
-                    modelPoints = modelPoints + ",\n"
-                channelMap = channelMap + str(sens.Label2) # channelMap stored in the obj destription
-                modelNormals = modelNormals + "        [" + str(round(normal_vec[0], 8)) + ", " + str(round(normal_vec[1], 8)) + ", "+ str(round(normal_vec[2], 8)) + "]"
-                modelPoints = modelPoints + "       [" + str(round(base_vec.x/1000, 8)) + ", " + str(round(base_vec.y/1000, 8)) + ", "+ str(round(base_vec.z/1000, 8)) + "]"
-
-        imu_pl = find_imu_pl()
-        if (imu_pl):
-            base_vec = imu_pl.Base
-            imuPosition = "[ " + str(round(base_vec.x/1000, 8)) + ", " +  str(round(base_vec.y/1000, 8)) + ", " + str(round(base_vec.z/1000, 8)) + " ]"
-            mat = imu_pl.Matrix
-            imuX = App.Vector(mat.A11, mat.A21, mat.A31)
-            imuZ = App.Vector(mat.A13, mat.A23, mat.A33)
-            imuPlusX = "[ " + str(round(imuX[0], 8)) + ", " + str(round(imuX[1], 8)) + ", "+ str(round(imuX[2], 8)) + "]"
-            imuPlusZ = "[ " + str(round(imuZ[0], 8)) + ", " + str(round(imuZ[1], 8)) + ", "+ str(round(imuZ[2], 8)) + "]"
-
-        json = str("{\n\
-            \"manufacturer\" : \"\",\n\
-            \"model_number\" : \"\",\n\
-            \"device_class\" : \"controller\",\n\
-            \"device_vid\" : 10462,\n\
-            \"device_pid\" : 8960,\n\
-            \"device_serial_number\" : \"LHR-XXXXXXXX\",\n\
-            \"lighthouse_config\" : ")
-
-        json = json + str("{\n    \"channelMap\" : [" + channelMap + "], \n    \"modelNormals\": [\n" + modelNormals + "\n    ],\n" + "    \"modelPoints\" : [\n" + modelPoints + "\n    ]\n},\n")
-
-        json = json + str(   "\"imu\" : {\n\
-            \"acc_bias\" : [ 0, 0, 0 ],\n\
-            \"acc_scale\" : [ 1, 1, 1 ],\n\
-            \"gyro_bias\" : [ 0, 0, 0 ],\n\
-            \"gyro_scale\" : [ 1, 1, 1 ],\n\
-            \"plus_x\" : " + imuPlusX + ",\n\
-            \"plus_z\" : " + imuPlusZ + ",\n\
-            \"position\" : " + imuPosition + "\n\
-        },\n")
-        json = json + get_json_tail()
-        return json
-
+        config = get_config()
+        with ins.span('write_json'):
+            tc.write_config(config, filename)
     except Exception as e:
-        print ("JSON: Something went wrong")
+        print ("JSON: Something went wrong, nothing saved")
         print(e)
-        return ""
-
-def get_json_tail():
-    tail = """   "render_model" : "ref_controller",
-   "head" : {
-      "plus_x" : [ 1, 0, 0 ],
-      "plus_z" : [ 0, 0, 1 ],
-      "position" : [ 0, 0, 0 ]
-   },
-   "revision" : 3,
-   "display_edid" : [ "", "" ],
-   "lens_separation" : 0.06230000033974648,
-   "device" : {
-      "eye_target_height_in_pixels" : 1080,
-      "eye_target_width_in_pixels" : 960,
-      "first_eye" : "eEYE_LEFT",
-      "last_eye" : "eEYE_RIGHT",
-      "num_windows" : 1,
-      "persistence" : 0.01666999980807304,
-      "physical_aspect_x_over_y" : 0.8000000119209290
-   },
-   "tracking_to_eye_transform" : [
-      {
-         "distortion" : {
-            "center_x" : 0.0,
-            "center_y" : 0.0,
-            "coeffs" : [ 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0 ],
-            "type" : "DISTORT_DPOLY3"
-         },
-         "distortion_blue" : {
-            "center_x" : 0.0,
-            "center_y" : 0.0,
-            "coeffs" : [ 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0 ],
-            "type" : "DISTORT_DPOLY3"
-         },
-         "distortion_red" : {
-            "center_x" : 0.0,
-            "center_y" : 0.0,
-            "coeffs" : [ 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0 ],
-            "type" : "DISTORT_DPOLY3"
-         },
-         "extrinsics" : [
-            [ 1.0, 0.0, 0.0, 0.03115000016987324 ],
-            [ 0.0, 1.0, 0.0, 0.0 ],
-            [ 0.0, 0.0, 1.0, 0.0 ]
-         ],
-         "grow_for_undistort" : 0.0,
-         "intrinsics" : [
-            [ 1.250, 0.0, 0.0 ],
-            [ 0.0, 1.0, 0.0 ],
-            [ 0.0, 0.0, -1.0 ]
-         ],
-         "undistort_r2_cutoff" : 1.50
-      },
-      {
-         "distortion" : {
-            "center_x" : 0.0,
-            "center_y" : 0.0,
-            "coeffs" : [ 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0 ],
-            "type" : "DISTORT_DPOLY3"
-         },
-         "distortion_blue" : {
-            "center_x" : 0.0,
-            "center_y" : 0.0,
-            "coeffs" : [ 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0 ],
-            "type" : "DISTORT_DPOLY3"
-         },
-         "distortion_red" : {
-            "center_x" : 0.0,
-            "center_y" : 0.0,
-            "coeffs" : [ 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0 ],
-            "type" : "DISTORT_DPOLY3"
-         },
-         "extrinsics" : [
-            [ 1.0, 0.0, 0.0, -0.03115000016987324 ],
-            [ 0.0, 1.0, 0.0, 0.0 ],
-            [ 0.0, 0.0, 1.0, 0.0 ]
-         ],
-         "grow_for_undistort" : 0.0,
-         "intrinsics" : [
-            [ 1.250, 0.0, 0.0 ],
-            [ 0.0, 1.0, 0.0 ],
-            [ 0.0, 0.0, -1.0 ]
-         ],
-         "undistort_r2_cutoff" : 1.50
-      }
-   ],
-    "type" : "Lighthouse_HMD",
-    "firmware_config": {
-         "sensor_env_on_pin_a":"0x7FFFF800"
-    }
-}"""
-    return tail
+
+# sensors with LCS-Diode, in the order of JSON entries, with their link and LCS-Diode placements
+def diode_sensors():
+    with ins.span('lookup'):
+        sensors = doc_index.get_index(doc).find_objects(sensor_label)
+    found = []
+    link_pls = []
+    lcsdiode_pls = []
+    for idx, sens in enumerate(sensors):
+        with ins.span('diode_placement', sensor=idx):
+            link_pl, lcsdiode_pl = find_diode_pls(sens)
+        if link_pl:
+            found.append(sens)
+            link_pls.append(link_pl)
+            lcsdiode_pls.append(lcsdiode_pl)
+    return found, link_pls, lcsdiode_pls
+
+# builds tracker configuration model (see tracker_config.py) from sensors and IMU placements
+@ins.traced()
+def get_config():
+    config = tc.default_config()
+    sensors, link_pls, lcsdiode_pls = diode_sensors()
+    channels = [sens.Label2 for sens in sensors] # channelMap stored in the obj destription
+    # all diode placements are computed at once
+    with ins.span('diode_points_normals', sensors=len(link_pls)):
+        points, normals = pm.diode_points_normals(pm.from_placements(link_pls), pm.from_placements(lcsdiode_pls))
+        tc.set_sensors(config, channels, points, normals)
+
+    with ins.span('imu'):
+        link_pl, lcsimu_pl = find_imu_pls()
+        if (link_pl):
+            position, imuX, imuZ = pm.imu_frame(pm.from_placements([link_pl]), pm.from_placements([lcsimu_pl]))
+            tc.set_imu(config, position[0], imuX[0], imuZ[0])
+    return config
+
+def get_json():
+    config = get_config()
+    with ins.span('dumps_json'):
+        return tc.dumps_config(config)
 
 def run():
     save_json()
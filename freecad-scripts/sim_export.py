@@ -0,0 +1,164 @@
+# SPDX-License-Identifier: Apache-2.0
+# Copyright (c) 2023 Adrian Przekwas <adrian.v.przekwas@gmail.com>
+
+# Simulation mesh export of "Tracker edited (simple)" (cut_obj_sim), replacing the OpenSCAD workbench export with a hand-tuned
+# triangulation precision. Tolerance is chosen per face: faces near sensor apertures (s_lcs positions) are meshed with
+# fine_tol, all others with coarse_tol. Coplanar faces are merged first (removeSplitter), so flat regions become
+# a few large polygons triangulated with the minimum number of triangles.
+# Fine faces are meshed first: edges shared with coarse faces keep their fine discretization, so the mesh should stay watertight.
+# The report counts open edges (used by one triangle) and non-manifold edges (more than two) after vertices are merged,
+# both are 0 for a watertight mesh.
+# The mesh is written as .scad (polyhedron, same as the OpenSCAD export) and/or binary .stl, the report contains triangle
+# count and the maximum deviation from the surfaces, sampled at triangle centroids of curved faces.
+# Meshes are kept in the geometry cache (geometry_cache.py), keyed by the shape, tolerances and sensor positions.
+# In FreeCAD, use export_sim() from sensor-builder.py.
+
+import time
+import numpy as np
+
+import scad_mesh
+import geometry_cache
+
+fine_tol = 0.02 # mm, around sensor apertures
+coarse_tol = 0.2 # mm, elsewhere
+fine_radius = 6.0 # mm, faces closer than this to an s_lcs position are fine
+merge_tol = 1e-6 # mm, duplicated vertices on shared edges are merged
+deviation_samples = 64 # per curved face
+
+def face_box_distances(face, points):
+    if not len(points):
+        return np.zeros(0)
+    bb = face.BoundBox
+    lo = np.array([bb.XMin, bb.YMin, bb.ZMin])
+    hi = np.array([bb.XMax, bb.YMax, bb.ZMax])
+    return np.linalg.norm(np.maximum(np.maximum(lo - points, 0.0), points - hi), axis=1)
+
+def is_planar(face):
+    return face.Surface.__class__.__name__ == 'Plane'
+
+# tolerance for every face, the order in which faces are meshed (fine first)
+def face_tolerances(faces, sensor_points, fine = fine_tol, coarse = coarse_tol, radius = fine_radius):
+    points = np.asarray(sensor_points, dtype=float).reshape(-1, 3)
+    tols = []
+    for face in faces:
+        near = len(points) and face_box_distances(face, points).min() <= radius
+        tols.append(fine if near else coarse)
+    order = sorted(range(len(faces)), key=lambda idx: tols[idx])
+    return tols, order
+
+# merges vertices closer than tol (on edges shared by faces), drops degenerate triangles
+def merge_vertices(points, faces, tol = merge_tol):
+    keys = np.round(points / tol).astype(np.int64)
+    _, first, inverse = np.unique(keys, axis=0, return_index=True, return_inverse=True)
+    inverse = inverse.reshape(-1)
+    faces = inverse[faces]
+    keep = (faces[:, 0] != faces[:, 1]) & (faces[:, 1] != faces[:, 2]) & (faces[:, 0] != faces[:, 2])
+    return points[first], faces[keep]
+
+# numbers of edges used by a single triangle and by more than two triangles
+def edge_counts(faces):
+    faces = np.asarray(faces, dtype=np.int64).reshape(-1, 3)
+    if not len(faces):
+        return 0, 0
+    edges = np.sort(np.concatenate((faces[:, [0, 1]], faces[:, [1, 2]], faces[:, [2, 0]])), axis=1)
+    _, uses = np.unique(edges, axis=0, return_counts=True)
+    return int(np.sum(uses == 1)), int(np.sum(uses > 2))
+
+def sample_deviation(face, points, triangles, samples = deviation_samples):
+    import FreeCAD as App
+    import Part
+    if is_planar(face) or not len(triangles):
+        return 0.0
+    step = max(1, len(triangles) // samples)
+    centroids = points[triangles[::step]].mean(axis=1)
+    surf = face.Surface
+    deviation = 0.0
+    for c in centroids:
+        pos = App.Vector(*c.tolist())
+        try:
+            distance = surf.projectPoint(pos, 'LowerDistance')
+        except Exception: # projection failed, fall back to the exact distance to the face
+            distance = Part.Vertex(pos).distToShape(face)[0]
+        deviation = max(deviation, distance)
+    return deviation
+
+# returns (points (N, 3), triangles (M, 3), report) of shape meshed with tolerances adapted to sensor_points (in mm)
+def mesh_shape(shape, sensor_points, fine = fine_tol, coarse = coarse_tol, radius = fine_radius, cache = True):
+    if not cache:
+        return compute_mesh(shape, sensor_points, fine, coarse, radius)
+    t0 = time.perf_counter()
+    tag = '_'.join(str(v) for v in (fine, coarse, radius, merge_tol, deviation_samples))
+    tag += '_' + geometry_cache.array_key(np.asarray(sensor_points, dtype=float).reshape(-1, 3))
+    names = ('sim_points_' + tag, 'sim_triangles_' + tag, 'sim_report2_' + tag)
+    computed = []
+    def compute():
+        points, triangles, report = compute_mesh(shape, sensor_points, fine, coarse, radius)
+        computed.append(report)
+        return points, triangles, np.array([report['faces'], report['fine_faces'], report['max_deviation'], report['mesh_time'],
+                                            report['open_edges'], report['nonmanifold_edges']])
+    points, triangles, stats = geometry_cache.cached(geometry_cache.shape_key(shape), names, compute)
+    report = {
+        'faces': int(stats[0]),
+        'fine_faces': int(stats[1]),
+        'points': len(points),
+        'triangles': len(triangles),
+        'max_deviation': float(stats[2]),
+        'mesh_time': float(stats[3]),
+        'open_edges': int(stats[4]),
+        'nonmanifold_edges': int(stats[5]),
+        'total_time': time.perf_counter() - t0,
+        'cached': not computed,
+    }
+    return points, triangles, report
+
+def compute_mesh(shape, sensor_points, fine, coarse, radius):
+    t0 = time.perf_counter()
+    shape = shape.removeSplitter().copy() # a fresh copy without triangulation left by the 3D view
+    faces = shape.Faces
+    tols, order = face_tolerances(faces, sensor_points, fine, coarse, radius)
+    face_meshes = [None] * len(faces)
+    for idx in order:
+        pts, tris = faces[idx].tessellate(tols[idx])
+        face_meshes[idx] = (np.array([[p.x, p.y, p.z] for p in pts], dtype=float).reshape(-1, 3),
+                            np.array(tris, dtype=np.int64).reshape(-1, 3))
+    t1 = time.perf_counter()
+
+    max_deviation = 0.0
+    all_points = []
+    all_tris = []
+    offset = 0
+    for face, (pts, tris) in zip(faces, face_meshes):
+        max_deviation = max(max_deviation, sample_deviation(face, pts, tris))
+        all_points.append(pts)
+        all_tris.append(tris + offset)
+        offset += len(pts)
+    points, triangles = merge_vertices(np.concatenate(all_points), np.concatenate(all_tris))
+    open_edges, nonmanifold_edges = edge_counts(triangles)
+    report = {
+        'faces': len(faces),
+        'fine_faces': sum(1 for tol in tols if tol == fine),
+        'points': len(points),
+        'triangles': len(triangles),
+        'max_deviation': max_deviation,
+        'open_edges': open_edges,
+        'nonmanifold_edges': nonmanifold_edges,
+        'mesh_time': t1 - t0,
+        'total_time': time.perf_counter() - t0,
+    }
+    return points, triangles, report
+
+def export_mesh(shape, sensor_points, scad_path = None, stl_path = None, **options):
+    points, triangles, report = mesh_shape(shape, sensor_points, **options)
+    if scad_path:
+        scad_mesh.write_scad_polyhedron(scad_path, points, triangles, 'CSG file generated by sim_export.py')
+    if stl_path:
+        scad_mesh.write_stl(stl_path, points, triangles, 'STL file generated by sim_export.py')
+    return report
+
+def print_report(report):
+    print ('Simulation mesh: ' + str(report['triangles']) + ' triangles, ' + str(report['points']) + ' points, '
+           + str(report['fine_faces']) + ' of ' + str(report['faces']) + ' faces fine')
+    print ('Max deviation: ' + str(round(report['max_deviation'], 4)) + ' mm, time: ' + str(round(report['total_time'], 3)) + ' s'
+           + (' (cached)' if report.get('cached') else ''))
+    if report['open_edges'] or report['nonmanifold_edges']:
+        print ('Mesh is not watertight: ' + str(report['open_edges']) + ' open edges, ' + str(report['nonmanifold_edges']) + ' non-manifold edges')
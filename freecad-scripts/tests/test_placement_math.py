@@ -0,0 +1,114 @@
+# SPDX-License-Identifier: Apache-2.0
+# Copyright (c) 2023 Adrian Przekwas <adrian.v.przekwas@gmail.com>
+
+# placement_math.py tests, plain numpy, FreeCAD isn't needed. Run: python3 -m pytest freecad-scripts/tests
+
+import os
+import sys
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import placement_math as pm
+
+# (x, y, z, w) of a rotation by angle (degrees) around axis
+def axis_quat(axis, angle):
+    axis = np.asarray(axis, dtype=float)
+    half = np.radians(angle) / 2
+    return np.append(axis / np.linalg.norm(axis) * np.sin(half), np.cos(half))
+
+def random_quats(n, seed = 0):
+    q = np.random.default_rng(seed).normal(size=(n, 4))
+    return q / np.linalg.norm(q, axis=1, keepdims=True)
+
+def random_mats(n, seed = 0):
+    bases = np.random.default_rng(seed + 1).uniform(-100, 100, size=(n, 3))
+    return pm.placements_to_matrices(bases, random_quats(n, seed))
+
+# the same quaternion up to sign
+def assert_same_quats(a, b):
+    a = np.asarray(a)
+    b = np.asarray(b)
+    sign = np.where(np.sum(a * b, axis=-1, keepdims=True) < 0, -1.0, 1.0)
+    np.testing.assert_allclose(a, sign * b, atol=1e-12)
+
+# stand-ins for App.Placement, only what from_placements() reads
+class Vector:
+    def __init__(self, x, y, z):
+        self.x, self.y, self.z = x, y, z
+
+class Rotation:
+    def __init__(self, q):
+        self.Q = tuple(q)
+
+class Placement:
+    def __init__(self, base, q):
+        self.Base = Vector(*base)
+        self.Rotation = Rotation(q)
+
+def test_quat_matrix_round_trip():
+    quats = random_quats(500)
+    rots = pm.quat_to_matrix(quats)
+    np.testing.assert_allclose(np.matmul(rots, np.swapaxes(rots, -1, -2)), np.broadcast_to(np.eye(3), rots.shape), atol=1e-12)
+    np.testing.assert_allclose(np.linalg.det(rots), 1.0)
+    assert_same_quats(pm.matrix_to_quat(rots), quats)
+    assert np.all(pm.matrix_to_quat(rots)[:, 3] >= 0)
+
+def test_quat_matrix_round_trip_180():
+    axes = [(1, 0, 0), (0, 1, 0), (0, 0, 1), (1, 1, 0), (1, -1, 1), (0.3, -0.2, 0.9)]
+    quats = np.array([axis_quat(axis, 180) for axis in axes])
+    rots = pm.quat_to_matrix(quats)
+    np.testing.assert_allclose(np.trace(rots, axis1=-2, axis2=-1), -1.0, atol=1e-12)
+    assert_same_quats(pm.matrix_to_quat(rots), quats)
+    np.testing.assert_allclose(pm.quat_to_matrix(pm.matrix_to_quat(rots)), rots, atol=1e-12)
+
+def test_quat_to_matrix_fixed():
+    np.testing.assert_allclose(pm.quat_to_matrix([axis_quat((0, 0, 1), 90)])[0], [[0, -1, 0], [1, 0, 0], [0, 0, 1]], atol=1e-12)
+    np.testing.assert_allclose(pm.quat_to_matrix([(0, 0, 0, 1)])[0], np.eye(3))
+
+def test_placements_matrices_round_trip():
+    mats = random_mats(100)
+    bases, quats = pm.matrices_to_placements(mats)
+    np.testing.assert_allclose(pm.placements_to_matrices(bases, quats), mats, atol=1e-12)
+
+def test_compose_invert():
+    a = random_mats(50, 1)
+    b = random_mats(50, 2)
+    identity = np.broadcast_to(np.eye(4), a.shape)
+    np.testing.assert_allclose(pm.compose(a, pm.invert(a)), identity, atol=1e-12)
+    np.testing.assert_allclose(pm.compose(pm.invert(a), a), identity, atol=1e-12)
+    np.testing.assert_allclose(pm.invert(a), np.linalg.inv(a), atol=1e-12)
+    np.testing.assert_allclose(pm.invert(pm.compose(a, b)), pm.compose(pm.invert(b), pm.invert(a)), atol=1e-12)
+    # a single placement is broadcast over a stack
+    np.testing.assert_allclose(pm.compose(a[0], b), np.stack([a[0] @ m for m in b]), atol=1e-12)
+
+def test_compose_fixed():
+    # translation by (1, 2, 3) after a 90 degree rotation around Z, applied to the point (1, 0, 0)
+    rot = pm.placements_to_matrices([(0, 0, 0)], [axis_quat((0, 0, 1), 90)])
+    move = pm.placements_to_matrices([(1, 2, 3)], [(0, 0, 0, 1)])
+    np.testing.assert_allclose(pm.compose(move, rot)[0] @ [1, 0, 0, 1], [1, 3, 3, 1], atol=1e-12)
+    np.testing.assert_allclose(pm.compose(rot, move)[0] @ [1, 0, 0, 1], [-2, 2, 3, 1], atol=1e-12)
+
+# the extraction before placement_math.py: global placement link_pl * lcsdiode_pl, point from its Base in meters,
+# normal from its Matrix as App.Vector(mat.A13, mat.A23, mat.A33)
+def old_diode_point_normal(link_mat, lcsdiode_mat):
+    mat = link_mat @ lcsdiode_mat
+    a13, a23, a33 = mat[0, 2], mat[1, 2], mat[2, 2]
+    return mat[:3, 3] / 1000, np.array([a13, a23, a33])
+
+def test_diode_points_normals_fixed():
+    # sensor link turned 90 degrees around Z, LCS-Diode 1 mm along its X and turned 90 degrees around X
+    link_pls = [Placement((10, 20, 30), axis_quat((0, 0, 1), 90)), Placement((0, 0, 0), (0, 0, 0, 1))]
+    lcsdiode_pls = [Placement((1, 0, 0), axis_quat((1, 0, 0), 90)), Placement((5, 0, -5), (0, 0, 0, 1))]
+    points, normals = pm.diode_points_normals(pm.from_placements(link_pls), pm.from_placements(lcsdiode_pls))
+    np.testing.assert_allclose(points, [[0.010, 0.021, 0.030], [0.005, 0, -0.005]], atol=1e-12)
+    np.testing.assert_allclose(normals, [[1, 0, 0], [0, 0, 1]], atol=1e-12)
+
+def test_diode_points_normals_old_extraction():
+    link_mats = random_mats(20, 3)
+    lcsdiode_mats = random_mats(20, 4)
+    points, normals = pm.diode_points_normals(link_mats, lcsdiode_mats)
+    for link_mat, lcsdiode_mat, point, normal in zip(link_mats, lcsdiode_mats, points, normals):
+        old_point, old_normal = old_diode_point_normal(link_mat, lcsdiode_mat)
+        np.testing.assert_allclose(point, old_point, atol=1e-12)
+        np.testing.assert_allclose(normal, old_normal, atol=1e-12)
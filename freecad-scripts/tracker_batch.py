@@ -0,0 +1,194 @@
+# SPDX-License-Identifier: Apache-2.0
+# Copyright (c) 2023 Adrian Przekwas <adrian.v.przekwas@gmail.com>
+
+# Headless batch pipeline for many tracker assemblies.
+# Every .FCStd file is processed by a separate FreeCADCmd process: sensors are placed and cut (place_cut_sensors()),
+# the JSON configuration is extracted (get_config()) and "Tracker edited (simple)" is exported as .scad and .stl simulation meshes
+# (see sim_export.py).
+# Files are spread over a pool of workers, every worker writes a per-file report, a summary is written at the end.
+#
+# Usage (plain python3 is enough for the master process, FreeCADCmd is found in PATH or set with FREECADCMD):
+#   python3 tracker_batch.py -o output_dir -j 4 tracker1.FCStd tracker2.FCStd ...
+# Options:
+#   --simple-only   cut only with "stamp-simplified" (skips the full detail cut)
+#   --no-cut        only extract JSON, keep the document as it is
+#   --save          save processed assemblies into the output dir
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import subprocess
+import importlib.util
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+job_env = 'TRACKER_BATCH_JOB'
+scripts_dir = os.path.dirname(os.path.abspath(__file__))
+if scripts_dir not in sys.path:
+    sys.path.append(scripts_dir)
+
+import tracker_config
+
+# loads one of the scripts from this directory as a module, also those with "-" in the file name
+def load_script(filename):
+    name = os.path.splitext(filename)[0].replace('-', '_')
+    spec = importlib.util.spec_from_file_location(name, os.path.join(scripts_dir, filename))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def find_freecadcmd():
+    cmd = os.environ.get('FREECADCMD')
+    if cmd:
+        return cmd
+    for name in ('FreeCADCmd', 'freecadcmd', 'FreeCADCmd.exe'):
+        path = shutil.which(name)
+        if path:
+            return path
+    return None
+
+def file_stem(path):
+    return os.path.splitext(os.path.basename(path))[0]
+
+# runs inside FreeCADCmd, processes a single assembly
+def process_file(job):
+    import FreeCAD as App
+    report = {'file': job['file'], 'status': 'ok', 'outputs': {}, 'times': {}}
+    stem = file_stem(job['file'])
+    t_start = time.perf_counter()
+    doc = App.openDocument(job['file'])
+    App.setActiveDocument(doc.Name)
+    builder = load_script('sensor-builder.py')
+    extraction = load_script('sensor-extraction.py')
+    builder.set_document(doc)
+    extraction.set_document(doc)
+    report['sensors'] = len(doc.findObjects(Label=builder.sensor_label))
+    report['times']['open'] = time.perf_counter() - t_start
+
+    failed_cuts = []
+    if job.get('cut', True):
+        variants = [True] if job.get('simple_only') else [False, True]
+        for simple in variants:
+            stamp = builder.stamp_simple_label if simple else builder.stamp_label
+            if not doc.getObjectsByLabel(stamp):
+                report['outputs'][stamp] = 'missing'
+                continue
+            cut_name = 'cut_obj_sim' if simple else 'cut_obj'
+            old_shape = doc.getObject(cut_name).Shape if doc.getObject(cut_name) else None
+            t0 = time.perf_counter()
+            builder.place_cut_sensors(simple)
+            report['times']['cut_simple' if simple else 'cut'] = time.perf_counter() - t0
+            # place_cut_sensors() only prints why it aborted, a shape left from an earlier run isn't this run's result
+            cut_obj = doc.getObject(cut_name)
+            if cut_obj is None or (old_shape is not None and cut_obj.Shape.isSame(old_shape)):
+                failed_cuts.append(cut_name)
+                report['status'] = 'error'
+                report['error'] = 'cut with ' + stamp + ' failed, ' + cut_name + ' not updated (see the log)'
+
+    t0 = time.perf_counter()
+    json_path = os.path.join(job['out_dir'], stem + '.json')
+    tracker_config.write_config(extraction.get_config(), json_path)
+    report['outputs']['json'] = json_path
+    report['times']['json'] = time.perf_counter() - t0
+
+    if doc.getObject('cut_obj_sim') and 'cut_obj_sim' not in failed_cuts:
+        t0 = time.perf_counter()
+        scad_path = os.path.join(job['out_dir'], stem + '.scad')
+        stl_path = os.path.join(job['out_dir'], stem + '.stl')
+        report['mesh'] = builder.export_sim(scad_path, stl_path)
+        report['outputs']['scad'] = scad_path
+        report['outputs']['stl'] = stl_path
+        report['times']['scad'] = time.perf_counter() - t0
+
+    if job.get('save'):
+        fcstd_path = os.path.join(job['out_dir'], stem + '.FCStd')
+        doc.saveAs(fcstd_path)
+        report['outputs']['fcstd'] = fcstd_path
+    App.closeDocument(doc.Name)
+    report['times']['total'] = time.perf_counter() - t_start
+    return report
+
+report_keys = ('file', 'variant') # job keys copied into the report of a failed job
+
+# entry point of worker scripts (this one, tracker_bench.py, tracker_sweep.py, background_cut.py):
+# inside a FreeCADCmd worker func(job) returns the report written to job['report'], otherwise main() runs
+def worker_main(func, main = None):
+    if job_env not in os.environ:
+        if main:
+            sys.exit(main())
+        return
+    job = json.loads(os.environ[job_env])
+    try:
+        report = func(job)
+    except Exception as e:
+        report = {key: job[key] for key in report_keys if key in job}
+        report.update({'status': 'error', 'error': str(e), 'traceback': traceback.format_exc()})
+    with open(job['report'], 'w') as outfile:
+        json.dump(report, outfile, indent=2)
+
+# runs in the master process, starts a FreeCADCmd worker for a single file and waits for its report
+# script is the worker script run by FreeCADCmd, this one by default
+def run_job(freecadcmd, job, timeout, script = None):
+    env = dict(os.environ)
+    env[job_env] = json.dumps(job)
+    t0 = time.perf_counter()
+    try:
+        proc = subprocess.run([freecadcmd, script or os.path.abspath(__file__)], env=env, capture_output=True, text=True, timeout=timeout)
+        log = proc.stdout + proc.stderr
+    except subprocess.TimeoutExpired:
+        return {'file': job['file'], 'status': 'timeout', 'times': {'total': time.perf_counter() - t0}}
+    with open(os.path.splitext(job['report'])[0] + '.log', 'w') as logfile:
+        logfile.write(log)
+    try:
+        with open(job['report']) as infile:
+            return json.load(infile)
+    except (OSError, ValueError):
+        return {'file': job['file'], 'status': 'error', 'error': 'worker exited with code ' + str(proc.returncode) + ' without a report'}
+
+# jobs are dicts with at least 'file', 'out_dir' and 'report', other keys are passed to process_file()
+def run_jobs(jobs, processes = None, timeout = None, freecadcmd = None, script = None):
+    freecadcmd = freecadcmd or find_freecadcmd()
+    if not freecadcmd:
+        raise RuntimeError('FreeCADCmd not found, set FREECADCMD environment variable')
+    processes = processes or os.cpu_count() or 1
+    with ThreadPoolExecutor(max_workers=processes) as pool:
+        return list(pool.map(lambda job: run_job(freecadcmd, job, timeout, script), jobs))
+
+def run_batch(files, out_dir, processes = None, timeout = None, **options):
+    os.makedirs(out_dir, exist_ok=True)
+    jobs = []
+    for path in files:
+        job = dict(options)
+        job['file'] = os.path.abspath(path)
+        job['out_dir'] = os.path.abspath(out_dir)
+        job['report'] = os.path.join(job['out_dir'], file_stem(path) + '.report.json')
+        jobs.append(job)
+    reports = run_jobs(jobs, processes, timeout)
+    with open(os.path.join(out_dir, 'summary.json'), 'w') as outfile:
+        json.dump(reports, outfile, indent=2)
+    return reports
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description='Place, cut and extract tracker configurations from many FreeCAD assemblies')
+    parser.add_argument('files', nargs='+', help='.FCStd tracker assemblies')
+    parser.add_argument('-o', '--out-dir', default='tracker-batch', help='output directory')
+    parser.add_argument('-j', '--processes', type=int, default=None, help='number of FreeCADCmd workers')
+    parser.add_argument('--timeout', type=float, default=None, help='timeout for a single file, in seconds')
+    parser.add_argument('--simple-only', action='store_true', help='cut only with stamp-simplified')
+    parser.add_argument('--no-cut', action='store_true', help='only extract JSON')
+    parser.add_argument('--save', action='store_true', help='save processed assemblies into the output dir')
+    args = parser.parse_args(argv)
+    reports = run_batch(args.files, args.out_dir, args.processes, args.timeout,
+                        simple_only=args.simple_only, cut=not args.no_cut, save=args.save)
+    failed = 0
+    for report in reports:
+        print(report['file'] + ': ' + report['status'])
+        if report['status'] != 'ok':
+            failed += 1
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    worker_main(process_file, main)
@@ -0,0 +1,247 @@
+# SPDX-License-Identifier: Apache-2.0
+# Copyright (c) 2023 Adrian Przekwas <adrian.v.przekwas@gmail.com>
+
+# Benchmark of placement, cutting and extraction on synthetic tracker assemblies.
+# Every case (number of support shape faces x number of sensors) runs in a separate FreeCADCmd process (see tracker_batch.py):
+# a faceted prism "tracker-base" body, sensor, stamp and mainboard links (to generated documents with LCS-es) are created,
+# then builder and extraction functions are timed one after another. Wall time, resident and peak memory are recorded after every step.
+# Results are written as JSON, --compare prints time ratios against results of another run (eg. from a previous commit).
+#
+# Usage (plain python3 for the master process, FreeCADCmd is found in PATH or set with FREECADCMD):
+#   python3 tracker_bench.py --faces 64 256 1024 --sensors 8 32 -o bench.json
+#   python3 tracker_bench.py --faces 64 256 1024 --sensors 8 32 -o bench-new.json --compare bench.json
+
+import os
+import sys
+import json
+import math
+import time
+import tempfile
+import argparse
+import itertools
+import subprocess
+
+scripts_dir = os.path.dirname(os.path.abspath(__file__))
+if scripts_dir not in sys.path:
+    sys.path.append(scripts_dir)
+
+import tracker_batch
+from instrumentation import rss_mb, peak_mb
+
+sensor_size = (3.0, 3.0, 1.0) # mm
+stamp_radius = 2.0
+stamp_height = 2.0
+sensor_gap = 1.0 # initial distance of sensors from the support shape surface
+sensor_pitch = 8.0 # mm along the support shape perimeter, sets its radius
+
+def add_lcs(doc, label, pl):
+    try:
+        lcs = doc.addObject('Part::LocalCoordinateSystem', 'LCS')
+    except Exception: # FreeCAD older than 1.0
+        lcs = doc.addObject('PartDesign::CoordinateSystem', 'LCS')
+    lcs.Label = label
+    lcs.Placement = pl
+    return lcs
+
+# document with a single part and LCS-es (label -> placement), returns the part to be linked
+def part_document(name, shape, lcses, tmp_dir):
+    import FreeCAD as App
+    part_doc = App.newDocument(name)
+    part = part_doc.addObject('Part::Feature', name)
+    part.Shape = shape
+    for label, pl in lcses.items():
+        add_lcs(part_doc, label, pl)
+    part_doc.recompute()
+    part_doc.saveAs(os.path.join(tmp_dir, name + '.FCStd'))
+    return part
+
+# regular prism with n_faces - 2 side faces, sensors in two rows on its side faces
+def synthetic_tracker(builder, n_faces, n_sensors, tmp_dir):
+    import FreeCAD as App
+    import Part
+    sensor_part = part_document('bench_sensor', Part.makeBox(*sensor_size, App.Vector(-sensor_size[0] / 2, -sensor_size[1] / 2, 0)),
+                                {'LCS-Base': App.Placement(), 'LCS-Diode': App.Placement(App.Vector(0, 0, sensor_size[2]), App.Rotation())}, tmp_dir)
+    stamp_part = part_document('bench_stamp', Part.makeCylinder(stamp_radius, stamp_height, App.Vector(0, 0, -stamp_height / 2)),
+                               {'LCS-Base': App.Placement()}, tmp_dir)
+    mainboard_part = part_document('bench_mainboard', Part.makeBox(20, 20, 2, App.Vector(-10, -10, 0)),
+                                   {'LCS-IMU': App.Placement(App.Vector(0, 0, 2), App.Rotation())}, tmp_dir)
+
+    doc = App.newDocument('bench_tracker')
+    sides = max(3, n_faces - 2)
+    radius = max(30.0, n_sensors * sensor_pitch / math.pi) # two rows of sensors
+    height = 30.0
+    polygon = [App.Vector(radius * math.cos(2 * math.pi * i / sides), radius * math.sin(2 * math.pi * i / sides), 0) for i in range(sides + 1)]
+    base = doc.addObject('Part::Feature', 'bench_base')
+    base.Shape = Part.Face(Part.makePolygon(polygon)).extrude(App.Vector(0, 0, height))
+    body = doc.addObject('PartDesign::Body', 'pdbody')
+    body.Label = builder.tracker_base_label
+    body.BaseFeature = base
+    if body.Tip is None:
+        body.Tip = base
+
+    inner = radius * math.cos(math.pi / sides) # distance of side faces from the axis
+    for idx in range(n_sensors):
+        angle = 2 * math.pi * (idx // 2) / ((n_sensors + 1) // 2) + (math.pi / sides) * (idx % 2)
+        normal = App.Vector(math.cos(angle), math.sin(angle), 0)
+        z = height * (0.3 + 0.4 * (idx % 2))
+        link = doc.addObject('App::Link', 'sensor' + str(idx))
+        link.setLink(sensor_part)
+        link.Label = builder.sensor_label + str(idx)
+        link.Label2 = str(idx)
+        link.LinkPlacement = App.Placement(normal * (inner + sensor_gap) + App.Vector(0, 0, z), App.Rotation(App.Vector(0, 0, 1), normal))
+    stamp = doc.addObject('App::Link', 'stamp')
+    stamp.setLink(stamp_part)
+    stamp.Label = builder.stamp_label
+    mainboard = doc.addObject('App::Link', 'mainboard')
+    mainboard.setLink(mainboard_part)
+    mainboard.Label = builder.mainboard_label
+    mainboard.LinkPlacement = App.Placement(App.Vector(0, 0, height / 2), App.Rotation())
+    doc.recompute()
+    doc.saveAs(os.path.join(tmp_dir, 'bench_tracker.FCStd'))
+    return doc
+
+def measure(report, name, func, *args, **kwargs):
+    t0 = time.perf_counter()
+    ret = func(*args, **kwargs)
+    report['steps'][name] = {'time': time.perf_counter() - t0, 'rss_mb': rss_mb(), 'peak_mb': peak_mb()}
+    return ret
+
+# runs inside FreeCADCmd, a single benchmark case
+def run_case(job):
+    import FreeCAD as App
+    report = {'file': job['file'], 'status': 'ok', 'faces': job['faces'], 'sensors': job['sensors'], 'steps': {}}
+    report['freecad'] = '.'.join(App.Version()[:3])
+    builder = tracker_batch.load_script('sensor-builder.py')
+    extraction = tracker_batch.load_script('sensor-extraction.py')
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        doc = measure(report, 'build', synthetic_tracker, builder, job['faces'], job['sensors'], tmp_dir)
+        App.setActiveDocument(doc.Name)
+        builder.set_document(doc)
+        extraction.set_document(doc)
+        tracker_obj = doc.getObject('pdbody')
+        tracker_shape = tracker_obj.Shape
+        stamp = doc.getObject('stamp')
+        sensors = builder.lookup().find_objects(builder.sensor_label)
+        report['actual_faces'] = len(tracker_shape.Faces)
+
+        positions = []
+        for s in sensors:
+            link_pl, lcsbase_pl = builder.find_pl(s)
+            positions.append((link_pl * lcsbase_pl).Base)
+        measure(report, 'find_point_normal', lambda: [builder.find_point_normal(tracker_shape, pos) for pos in positions])
+        measure(report, 'find_points_normals', builder.find_points_normals, tracker_shape, positions)
+
+        lcses = measure(report, 'create_lcses_sensors', builder.create_lcses_sensors, sensors, tracker_shape)
+        measure(report, 'move_to_lcses', builder.move_to_lcses, lcses, sensors)
+        cut_shape = measure(report, 'move_cut_stamps', builder.move_cut_stamps, lcses, stamp, tracker_shape)
+        report['cut_faces'] = len(cut_shape.Faces)
+        measure(report, 'recut_sensors', builder.recut_sensors)
+        builder.recut_sensors(incremental=True) # previous cut for the incremental recut
+        sensors[0].LinkPlacement = sensors[0].LinkPlacement.multiply(App.Placement(App.Vector(0.5, 0, 0), App.Rotation()))
+        measure(report, 'recut_sensors_incremental', builder.recut_sensors, incremental=True)
+        measure(report, 'save_corr', builder.save_corr)
+        measure(report, 'load_corr', builder.load_corr)
+        measure(report, 'get_json', extraction.get_json)
+
+        for name in list(App.listDocuments()):
+            if name.startswith('bench_'):
+                App.closeDocument(name)
+    report['peak_mb'] = peak_mb()
+    return report
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=scripts_dir, capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return ''
+
+# every case is run repeat times, the fastest time of every step and the highest memory are kept
+def merge_runs(runs):
+    ok = [run for run in runs if run['status'] == 'ok']
+    if not ok:
+        return runs[0]
+    merged = dict(ok[0])
+    merged['steps'] = {}
+    for name in ok[0]['steps']:
+        steps = [run['steps'][name] for run in ok if name in run['steps']]
+        merged['steps'][name] = {'time': min(step['time'] for step in steps),
+                                 'rss_mb': max(step['rss_mb'] for step in steps),
+                                 'peak_mb': max(step['peak_mb'] for step in steps)}
+    merged['peak_mb'] = max(run['peak_mb'] for run in ok)
+    merged['runs'] = len(ok)
+    return merged
+
+def run_bench(faces, sensors, repeat = 1, processes = 1, timeout = None):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        jobs = []
+        for n_faces, n_sensors in itertools.product(faces, sensors):
+            for run in range(repeat):
+                name = 'faces' + str(n_faces) + '-sensors' + str(n_sensors)
+                jobs.append({'file': name, 'faces': n_faces, 'sensors': n_sensors,
+                             'report': os.path.join(tmp_dir, name + '-' + str(run) + '.report.json')})
+        reports = tracker_batch.run_jobs(jobs, processes, timeout, script=os.path.abspath(__file__))
+    cases = [merge_runs(reports[i:i + repeat]) for i in range(0, len(reports), repeat)]
+    return {'commit': git_commit(), 'date': time.strftime('%Y-%m-%dT%H:%M:%S'), 'repeat': repeat, 'cases': cases}
+
+def case_key(case):
+    return (case['faces'], case['sensors'])
+
+# prints new/base time ratio of every step, returns the number of steps slower than threshold
+def compare_results(base, new, threshold = 1.1):
+    base_cases = {case_key(case): case for case in base['cases'] if case['status'] == 'ok'}
+    regressions = 0
+    print('Base: ' + base.get('commit', '') + ', new: ' + new.get('commit', ''))
+    for case in new['cases']:
+        base_case = base_cases.get(case_key(case))
+        if case['status'] != 'ok' or base_case is None:
+            continue
+        print(case['file'] + ': peak ' + str(round(base_case['peak_mb'], 1)) + ' -> ' + str(round(case['peak_mb'], 1)) + ' MB')
+        for name, step in case['steps'].items():
+            if name not in base_case['steps']:
+                continue
+            base_time = base_case['steps'][name]['time']
+            ratio = step['time'] / base_time if base_time > 0 else float('inf')
+            mark = ''
+            if ratio > threshold:
+                mark = '  slower'
+                regressions += 1
+            elif ratio < 1.0 / threshold:
+                mark = '  faster'
+            print('  ' + name.ljust(28) + str(round(base_time, 4)).rjust(10) + ' s' + str(round(step['time'], 4)).rjust(10) + ' s'
+                  + str(round(ratio, 2)).rjust(8) + 'x' + mark)
+    return regressions
+
+def print_results(results):
+    for case in results['cases']:
+        if case['status'] != 'ok':
+            print(case['file'] + ': ' + case['status'] + ' ' + case.get('error', ''))
+            continue
+        print(case['file'] + ' (' + str(case['actual_faces']) + ' faces, cut ' + str(case['cut_faces']) + ' faces), peak ' + str(round(case['peak_mb'], 1)) + ' MB')
+        for name, step in case['steps'].items():
+            print('  ' + name.ljust(28) + str(round(step['time'], 4)).rjust(10) + ' s' + str(round(step['rss_mb'], 1)).rjust(10) + ' MB')
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description='Benchmark sensor placement, cutting and extraction on synthetic trackers')
+    parser.add_argument('--faces', type=int, nargs='+', default=[64, 256, 1024], help='support shape face counts')
+    parser.add_argument('--sensors', type=int, nargs='+', default=[8, 32], help='sensor counts')
+    parser.add_argument('--repeat', type=int, default=1, help='runs of every case, the fastest one is kept')
+    parser.add_argument('-j', '--processes', type=int, default=1, help='cases run in parallel, keep 1 for stable timings')
+    parser.add_argument('--timeout', type=float, default=None, help='timeout for a single case, in seconds')
+    parser.add_argument('-o', '--out', help='save results to .json file')
+    parser.add_argument('--compare', help='results of a previous run to compare with')
+    parser.add_argument('--threshold', type=float, default=1.1, help='time ratio reported as a regression')
+    args = parser.parse_args(argv)
+
+    results = run_bench(args.faces, args.sensors, args.repeat, args.processes, args.timeout)
+    print_results(results)
+    if args.out:
+        with open(args.out, 'w') as outfile:
+            json.dump(results, outfile, indent=2)
+    if args.compare:
+        with open(args.compare) as infile:
+            regressions = compare_results(json.load(infile), results, args.threshold)
+        return 1 if regressions else 0
+    return 0 if all(case['status'] == 'ok' for case in results['cases']) else 1
+
+if __name__ == '__main__':
+    tracker_batch.worker_main(run_case, main)
@@ -0,0 +1,197 @@
+# SPDX-License-Identifier: Apache-2.0
+# Copyright (c) 2023 Adrian Przekwas <adrian.v.przekwas@gmail.com>
+
+# Tracker JSON configuration model, a plain dict tree in the same layout as tracker-json/tracker.json
+# default_config() gives a config with empty sensors, set_sensors() and set_imu() fill it with extracted geometry.
+# Configs are written with a streaming JSON encoder (short arrays of numbers are kept in a single line),
+# load_config() parses an existing tracker.json back into the same model.
+
+import os
+import json
+import copy
+import tempfile
+
+digits = 8 # rounding of sensor and IMU coordinates
+
+def distortion():
+    return {
+        "center_x" : 0.0,
+        "center_y" : 0.0,
+        "coeffs" : [ 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0 ],
+        "type" : "DISTORT_DPOLY3"
+    }
+
+def eye_transform(offset_x):
+    return {
+        "distortion" : distortion(),
+        "distortion_blue" : distortion(),
+        "distortion_red" : distortion(),
+        "extrinsics" : [
+            [ 1.0, 0.0, 0.0, offset_x ],
+            [ 0.0, 1.0, 0.0, 0.0 ],
+            [ 0.0, 0.0, 1.0, 0.0 ]
+        ],
+        "grow_for_undistort" : 0.0,
+        "intrinsics" : [
+            [ 1.250, 0.0, 0.0 ],
+            [ 0.0, 1.0, 0.0 ],
+            [ 0.0, 0.0, -1.0 ]
+        ],
+        "undistort_r2_cutoff" : 1.50
+    }
+
+def default_config():
+    return {
+        "manufacturer" : "",
+        "model_number" : "",
+        "device_class" : "controller",
+        "device_vid" : 10462,
+        "device_pid" : 8960,
+        "device_serial_number" : "LHR-XXXXXXXX",
+        "lighthouse_config" : {
+            "channelMap" : [],
+            "modelNormals" : [],
+            "modelPoints" : []
+        },
+        "imu" : {
+            "acc_bias" : [ 0, 0, 0 ],
+            "acc_scale" : [ 1, 1, 1 ],
+            "gyro_bias" : [ 0, 0, 0 ],
+            "gyro_scale" : [ 1, 1, 1 ],
+            "plus_x" : [],
+            "plus_z" : [],
+            "position" : []
+        },
+        "render_model" : "ref_controller",
+        "head" : {
+            "plus_x" : [ 1, 0, 0 ],
+            "plus_z" : [ 0, 0, 1 ],
+            "position" : [ 0, 0, 0 ]
+        },
+        "revision" : 3,
+        "display_edid" : [ "", "" ],
+        "lens_separation" : 0.06230000033974648,
+        "device" : {
+            "eye_target_height_in_pixels" : 1080,
+            "eye_target_width_in_pixels" : 960,
+            "first_eye" : "eEYE_LEFT",
+            "last_eye" : "eEYE_RIGHT",
+            "num_windows" : 1,
+            "persistence" : 0.01666999980807304,
+            "physical_aspect_x_over_y" : 0.8000000119209290
+        },
+        "tracking_to_eye_transform" : [
+            eye_transform(0.03115000016987324),
+            eye_transform(-0.03115000016987324)
+        ],
+        "type" : "Lighthouse_HMD",
+        "firmware_config" : {
+            "sensor_env_on_pin_a" : "0x7FFFF800" # the SIP pins for sensors 1-11 (channel map 0-10) are reversed
+        }
+    }
+
+def round_vec(vec):
+    return [round(float(v), digits) for v in vec]
+
+# channel is taken from sensor Label2, it has to be an integer
+def channel(label2):
+    try:
+        return int(label2)
+    except ValueError:
+        raise ValueError("Sensor channel (Label2) is not a number: '" + str(label2) + "'")
+
+def set_sensors(config, channels, points, normals):
+    lh = config["lighthouse_config"]
+    lh["channelMap"] = [channel(ch) for ch in channels]
+    lh["modelNormals"] = [round_vec(n) for n in normals]
+    lh["modelPoints"] = [round_vec(p) for p in points]
+    return config
+
+def set_sensor(config, idx, channel_label, point, normal):
+    lh = config["lighthouse_config"]
+    lh["channelMap"][idx] = channel(channel_label)
+    lh["modelNormals"][idx] = round_vec(normal)
+    lh["modelPoints"][idx] = round_vec(point)
+    return config
+
+def set_imu(config, position, plus_x, plus_z):
+    imu = config["imu"]
+    imu["plus_x"] = round_vec(plus_x)
+    imu["plus_z"] = round_vec(plus_z)
+    imu["position"] = round_vec(position)
+    return config
+
+def is_flat(value):
+    return isinstance(value, list) and not any(isinstance(v, (list, dict)) for v in value)
+
+# yields JSON text in chunks, arrays without nested containers are written in a single line
+def iter_json(value, indent = "   ", level = 0):
+    pad = indent * (level + 1)
+    if isinstance(value, dict) and value:
+        yield "{\n"
+        for idx, (key, item) in enumerate(value.items()):
+            yield pad + json.dumps(key) + " : "
+            yield from iter_json(item, indent, level + 1)
+            yield ",\n" if idx < len(value) - 1 else "\n"
+        yield indent * level + "}"
+    elif isinstance(value, list) and value and not is_flat(value):
+        yield "[\n"
+        for idx, item in enumerate(value):
+            yield pad
+            yield from iter_json(item, indent, level + 1)
+            yield ",\n" if idx < len(value) - 1 else "\n"
+        yield indent * level + "]"
+    else:
+        yield json.dumps(value, separators=(", ", " : "), allow_nan=False)
+
+def dump_config(config, outfile):
+    for chunk in iter_json(config):
+        outfile.write(chunk)
+    outfile.write("\n")
+
+def dumps_config(config):
+    return "".join(iter_json(config)) + "\n"
+
+# the file is replaced only when the whole config was written
+def write_config(config, filename):
+    dirname = os.path.dirname(os.path.abspath(filename))
+    fd, tmp_name = tempfile.mkstemp(prefix=".tracker-", suffix=".json", dir=dirname)
+    try:
+        with os.fdopen(fd, "w") as outfile:
+            dump_config(config, outfile)
+        os.replace(tmp_name, filename)
+    except BaseException:
+        os.unlink(tmp_name)
+        raise
+
+def load_config(filename):
+    with open(filename) as infile:
+        return json.load(infile)
+
+def loads_config(text):
+    return json.loads(text)
+
+def copy_config(config):
+    return copy.deepcopy(config)
+
+# returns a list of (path, value_a, value_b) for every difference, paths look like "lighthouse_config/modelPoints/3/0"
+def diff_configs(config_a, config_b, path = ""):
+    if isinstance(config_a, dict) and isinstance(config_b, dict):
+        diffs = []
+        for key in config_a:
+            if key in config_b:
+                diffs += diff_configs(config_a[key], config_b[key], path + "/" + key if path else key)
+            else:
+                diffs.append((path + "/" + key if path else key, config_a[key], None))
+        for key in config_b:
+            if key not in config_a:
+                diffs.append((path + "/" + key if path else key, None, config_b[key]))
+        return diffs
+    if isinstance(config_a, list) and isinstance(config_b, list) and len(config_a) == len(config_b):
+        diffs = []
+        for idx, (item_a, item_b) in enumerate(zip(config_a, config_b)):
+            diffs += diff_configs(item_a, item_b, path + "/" + str(idx))
+        return diffs
+    if config_a != config_b:
+        return [(path, config_a, config_b)]
+    return []
@@ -0,0 +1,172 @@
+# SPDX-License-Identifier: Apache-2.0
+# Copyright (c) 2023 Adrian Przekwas <adrian.v.przekwas@gmail.com>
+
+# Variant sweep of one tracker assembly over a grid of parameters:
+#   stamp        - "full" (stamp) and/or "simple" (stamp-simplified)
+#   initial_dir  - initial orientation of sensors (builder initial_dir, rotated with the mainboard)
+#   corrections  - correction sets (or spreadsheets of older documents) applied with load_corr() and recut ("none" for no corrections)
+# Every variant is built by a separate FreeCADCmd worker (see tracker_batch.py) from the same source file, which is only read,
+# never saved: sensors are placed and cut, JSON configuration is extracted and the cut shape is exported as .scad and .stl.
+# Every variant gets its own output directory, summary.json and summary.csv list all variants.
+#
+# Usage (plain python3 for the master process, FreeCADCmd is found in PATH or set with FREECADCMD):
+#   python3 tracker_sweep.py tracker.FCStd -o sweep --stamp full simple --initial-dir=-1,0,0 --initial-dir=0,-1,0 --corrections none default
+#   vectors are given with "=" (--initial-dir=-1,0,0), otherwise argparse takes a leading minus for an option
+#   --coverage adds sensor visibility of every variant to the summary (coverage.py, needs NumPy)
+
+import os
+import sys
+import csv
+import json
+import time
+import argparse
+import itertools
+
+scripts_dir = os.path.dirname(os.path.abspath(__file__))
+if scripts_dir not in sys.path:
+    sys.path.append(scripts_dir)
+
+import tracker_batch
+import tracker_config
+
+summary_columns = ['variant', 'status', 'stamp', 'initial_dir', 'corrections', 'sensors', 'triangles', 'open_edges', 'max_deviation',
+                   'min_visible', 'blind_fraction', 'time']
+
+def parse_vector(text):
+    values = [float(v) for v in text.split(',')]
+    if len(values) != 3:
+        raise argparse.ArgumentTypeError('vector needs 3 comma separated values: ' + text)
+    return values
+
+def format_vector(vec):
+    return ','.join(('%g' % v) for v in vec)
+
+def variant_name(stamp, initial_dir, corrections):
+    return stamp + '_dir' + format_vector(initial_dir).replace(',', '_') + '_' + corrections
+
+# all combinations of the parameters, in the order of the grid
+def variant_grid(stamps, initial_dirs, corrections):
+    variants = []
+    for stamp, initial_dir, corr in itertools.product(stamps, initial_dirs, corrections):
+        variants.append({'variant': variant_name(stamp, initial_dir, corr), 'stamp': stamp, 'initial_dir': initial_dir, 'corrections': corr})
+    return variants
+
+# runs inside FreeCADCmd, builds a single variant
+def build_variant(job):
+    import FreeCAD as App
+    report = {'file': job['file'], 'variant': job['variant'], 'status': 'ok', 'outputs': {}, 'times': {}}
+    simple = job['stamp'] == 'simple'
+    t_start = time.perf_counter()
+    doc = App.openDocument(job['file'])
+    App.setActiveDocument(doc.Name)
+    builder = tracker_batch.load_script('sensor-builder.py')
+    extraction = tracker_batch.load_script('sensor-extraction.py')
+    builder.set_document(doc)
+    extraction.set_document(doc)
+    builder.initial_dir = App.Vector(*job['initial_dir'])
+    report['sensors'] = len(builder.lookup().find_objects(builder.sensor_label))
+    report['times']['open'] = time.perf_counter() - t_start
+
+    t0 = time.perf_counter()
+    builder.place_cut_sensors(simple)
+    report['times']['cut'] = time.perf_counter() - t0
+    if job['corrections'] != 'none':
+        if not builder.corr_exists(job['corrections']):
+            raise RuntimeError('Correction set ' + job['corrections'] + ' not found')
+        t0 = time.perf_counter()
+        builder.load_corr(job['corrections'])
+        builder.recut_sensors(simple)
+        report['times']['corrections'] = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    json_path = os.path.join(job['out_dir'], 'tracker.json')
+    tracker_config.write_config(extraction.get_config(), json_path)
+    report['outputs']['json'] = json_path
+    report['times']['json'] = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    scad_path = os.path.join(job['out_dir'], 'tracker.scad')
+    stl_path = os.path.join(job['out_dir'], 'tracker.stl')
+    report['mesh'] = builder.export_sim(scad_path, stl_path, simple)
+    if report['mesh']:
+        report['outputs']['scad'] = scad_path
+        report['outputs']['stl'] = stl_path
+    report['times']['mesh'] = time.perf_counter() - t0
+
+    App.closeDocument(doc.Name)
+    report['times']['total'] = time.perf_counter() - t_start
+    return report
+
+# runs in the master process, visibility of sensors of a built variant
+def variant_coverage(report, n_directions = 5000):
+    import coverage
+    import scad_mesh
+    points, normals = coverage.config_sensors(tracker_config.load_config(report['outputs']['json']))
+    vertices, faces = scad_mesh.load_scad_polyhedron(report['outputs']['scad'])
+    result = coverage.analyze_coverage(points, normals, vertices, faces, n_directions=n_directions)
+    return result['min_count'], result['blind_fraction']
+
+def summary_row(variant, report):
+    row = {'variant': variant['variant'], 'status': report['status'], 'stamp': variant['stamp'],
+           'initial_dir': format_vector(variant['initial_dir']), 'corrections': variant['corrections']}
+    row['sensors'] = report.get('sensors', '')
+    mesh = report.get('mesh') or {}
+    row['triangles'] = mesh.get('triangles', '')
+    row['open_edges'] = mesh.get('open_edges', '')
+    row['max_deviation'] = round(mesh['max_deviation'], 4) if 'max_deviation' in mesh else ''
+    row['min_visible'] = report.get('min_visible', '')
+    row['blind_fraction'] = round(report['blind_fraction'], 4) if 'blind_fraction' in report else ''
+    row['time'] = round(report['times']['total'], 2) if 'total' in report.get('times', {}) else ''
+    return row
+
+def print_table(rows):
+    widths = [max(len(col), max((len(str(row[col])) for row in rows), default=0)) for col in summary_columns]
+    print('  '.join(col.ljust(width) for col, width in zip(summary_columns, widths)))
+    for row in rows:
+        print('  '.join(str(row[col]).ljust(width) for col, width in zip(summary_columns, widths)))
+
+def run_sweep(filename, out_dir, variants, processes = None, timeout = None, with_coverage = False):
+    os.makedirs(out_dir, exist_ok=True)
+    jobs = []
+    for variant in variants:
+        variant_dir = os.path.abspath(os.path.join(out_dir, variant['variant']))
+        os.makedirs(variant_dir, exist_ok=True)
+        job = dict(variant)
+        job['file'] = os.path.abspath(filename)
+        job['out_dir'] = variant_dir
+        job['report'] = os.path.join(variant_dir, 'report.json')
+        jobs.append(job)
+    reports = tracker_batch.run_jobs(jobs, processes, timeout, script=os.path.abspath(__file__))
+
+    rows = []
+    for variant, report in zip(variants, reports):
+        if with_coverage and report['status'] == 'ok' and 'scad' in report['outputs']:
+            report['min_visible'], report['blind_fraction'] = variant_coverage(report)
+        rows.append(summary_row(variant, report))
+    with open(os.path.join(out_dir, 'summary.json'), 'w') as outfile:
+        json.dump(reports, outfile, indent=2)
+    with open(os.path.join(out_dir, 'summary.csv'), 'w', newline='') as outfile:
+        writer = csv.DictWriter(outfile, fieldnames=summary_columns)
+        writer.writeheader()
+        writer.writerows(rows)
+    return reports, rows
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description='Build variants of a tracker assembly over a grid of stamp, orientation and correction parameters')
+    parser.add_argument('file', help='.FCStd tracker assembly')
+    parser.add_argument('-o', '--out-dir', default='tracker-sweep', help='output directory, one subdirectory per variant')
+    parser.add_argument('--stamp', nargs='+', choices=['full', 'simple'], default=['simple'], help='stamp variants')
+    parser.add_argument('--initial-dir', type=parse_vector, action='append', help='initial sensor orientation, may be repeated, eg. --initial-dir=-1,0,0 (default)')
+    parser.add_argument('--corrections', nargs='+', default=['none'], help='correction set (or spreadsheet) names, "none" for no corrections')
+    parser.add_argument('-j', '--processes', type=int, default=None, help='number of FreeCADCmd workers')
+    parser.add_argument('--timeout', type=float, default=None, help='timeout for a single variant, in seconds')
+    parser.add_argument('--coverage', action='store_true', help='add sensor visibility of every variant to the summary')
+    args = parser.parse_args(argv)
+
+    variants = variant_grid(args.stamp, args.initial_dir or [[-1.0, 0.0, 0.0]], args.corrections)
+    reports, rows = run_sweep(args.file, args.out_dir, variants, args.processes, args.timeout, args.coverage)
+    print_table(rows)
+    return 0 if all(report['status'] == 'ok' for report in reports) else 1
+
+if __name__ == '__main__':
+    tracker_batch.worker_main(build_variant, main)
@@ -0,0 +1,190 @@
+# SPDX-License-Identifier: Apache-2.0
+# Copyright (c) 2023 Adrian Przekwas <adrian.v.przekwas@gmail.com>
+
+# Opt-in live watch mode: a document observer that keeps red channel labels (add_sensor_labels.py), the correction set
+# (correction_store.py, corr_set) and the tracker JSON up to date while sensors are moved or their Label2 (channel) is edited.
+# Sensors moved by sensor-builder.py functions (eg. place_cut_sensors(), load_corr()) don't change the correction set.
+# Only changed sensors are updated. Rapid edits are collected and handled together after debounce_ms of quiet time,
+# the JSON file is written atomically (tracker_config.write_config) by a background thread, so the GUI doesn't wait for it.
+# Without the GUI there is no event loop for the debounce timer, call flush() to apply pending changes.
+#
+# Usage in FreeCAD Python console:
+#   import watch_mode
+#   watch_mode.start('/path/tracker.json')
+#   ...
+#   watch_mode.stop()
+
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+import FreeCAD as App
+import doc_index
+import placement_math as pm
+import tracker_config as tc
+import correction_store as corr_store
+import tracker_batch
+
+sensor_label = 'sensor'
+corr_set = corr_store.default_set # updated only if the document already has it
+debounce_ms = 300
+watched_props = ('LinkPlacement', 'Label2')
+builder_depth = 0 # sensor-builder.py batches in progress, sensors they move update labels and JSON, not corrections
+
+class SensorWatcher:
+    # entries maps sensor names to their index in the JSON (sensors without LCS-Diode aren't in it)
+    def __init__(self, doc, json_path, config, entries):
+        self.doc = doc
+        self.json_path = json_path
+        self.config = config
+        self.entries = entries
+        self.sensor_re = re.compile(sensor_label)
+        self.pending = set()
+        self.builder_moved = set() # pending sensors last changed by the builder
+        self.flushing = False
+        self.writer = ThreadPoolExecutor(max_workers=1) # keeps writes in order
+        self.last_write = None
+        self.timer = None
+        if App.GuiUp:
+            from PySide2 import QtCore
+            self.timer = QtCore.QTimer()
+            self.timer.setSingleShot(True)
+            self.timer.setInterval(debounce_ms)
+            self.timer.timeout.connect(self.flush_later)
+
+    def slotChangedObject(self, obj, prop):
+        if self.flushing or prop not in watched_props or obj.Document != self.doc:
+            return
+        if not self.sensor_re.search(obj.Label):
+            return
+        self.pending.add(obj.Name)
+        if builder_depth > 0:
+            self.builder_moved.add(obj.Name)
+        else:
+            self.builder_moved.discard(obj.Name)
+        if self.timer:
+            self.timer.start() # restarts the debounce interval
+
+    # the document is going away, pending changes are dropped
+    def slotDeletedDocument(self, doc):
+        if doc == self.doc:
+            stop(False)
+
+    # timer slot, an exception must not escape into the Qt event loop
+    def flush_later(self):
+        try:
+            self.flush()
+        except Exception as e:
+            print ('Watch mode: update failed, retried after the next change: ' + str(e))
+
+    # applies all pending changes, every sensor is updated once however many times it changed
+    # sensors with an invalid Label2 (eg. while it's being typed) stay pending until they are fixed
+    def flush(self):
+        if not self.pending:
+            return
+        self.flushing = True
+        try:
+            sensors = doc_index.get_index(self.doc).find_objects(sensor_label)
+            self.pending &= set(s.Name for s in sensors) # deleted sensors
+            changed = []
+            for idx, s in enumerate(sensors):
+                if s.Name not in self.pending:
+                    continue
+                try:
+                    tc.channel(s.Label2)
+                except ValueError as e:
+                    print ('Watch mode: ' + s.Label + ' skipped, ' + str(e))
+                    continue
+                changed.append((idx, s))
+            for idx, s in changed:
+                self.update_label(idx, s)
+            self.update_corrections([(idx, s) for idx, s in changed if s.Name not in self.builder_moved])
+            for _, s in changed:
+                if self.json_path and s.Name not in self.entries:
+                    print ('Watch mode: sensor ' + s.Label + ' is not in the configuration, restart watch mode')
+            self.update_json([(idx, s) for idx, s in changed if s.Name in self.entries])
+            self.doc.recompute()
+        finally:
+            self.flushing = False
+        self.pending -= set(s.Name for _, s in changed)
+        self.builder_moved &= self.pending
+        if changed:
+            print ('Watch mode: updated ' + ', '.join(s.Label for _, s in changed))
+
+    def update_label(self, idx, s):
+        label = self.doc.getObject('chlabel' + str(idx))
+        if label:
+            label.LabelText = 'ch' + s.Label2
+
+    # the same corrections as saved by save_corr() in sensor-builder.py, written with a single store update
+    def update_corrections(self, changed):
+        if not corr_store.has_set(self.doc, corr_set):
+            return
+        index = doc_index.get_index(self.doc)
+        lcses = index.sensor_lcses(index.find_objects(sensor_label)) # all sensors, older documents pair them by position
+        found = []
+        lcsbase_pls = []
+        for idx, s in changed:
+            if not lcses[idx]:
+                continue
+            try:
+                lcsbase_pls.append(index.linked_placement(s, 'LCS-Base'))
+            except IndexError:
+                print ('Watch mode: sensor ' + s.Label + ' has no LCS-Base, correction not updated')
+                continue
+            found.append((s, lcses[idx]))
+        if not found:
+            return
+        link_mats = pm.from_placements([s.LinkPlacement for s, _ in found])
+        base_mats = pm.compose(link_mats, pm.from_placements(lcsbase_pls))
+        diff_mats = pm.compose(pm.invert(pm.from_placements([lcs.Placement for _, lcs in found])), base_mats)
+        corrections = {s.Name: App.Placement(App.Matrix(*diff_mat.ravel().tolist())) for (s, _), diff_mat in zip(found, diff_mats)}
+        corr_store.update_set(self.doc, corr_set, corrections)
+
+    def update_json(self, changed):
+        if not changed or not self.json_path:
+            return
+        index = doc_index.get_index(self.doc)
+        link_mats = pm.from_placements([s.LinkPlacement for _, s in changed])
+        lcsdiode_mats = pm.from_placements([index.linked_placement(s, 'LCS-Diode') for _, s in changed])
+        points, normals = pm.diode_points_normals(link_mats, lcsdiode_mats)
+        for (_, s), point, normal in zip(changed, points, normals):
+            tc.set_sensor(self.config, self.entries[s.Name], s.Label2, point, normal)
+        self.last_write = self.writer.submit(tc.write_config, tc.copy_config(self.config), self.json_path)
+
+watcher = None
+
+# json_path=None only keeps labels and corrections up to date
+def start(json_path = None, doc = None):
+    global watcher
+    stop()
+    doc = doc or App.ActiveDocument
+    extraction = tracker_batch.load_script('sensor-extraction.py')
+    extraction.set_document(doc)
+    config = extraction.get_config()
+    entries = {s.Name: idx for idx, s in enumerate(extraction.diode_sensors()[0])}
+    if json_path:
+        tc.write_config(config, json_path)
+    watcher = SensorWatcher(doc, json_path, config, entries)
+    App.addDocumentObserver(watcher)
+    print ('Watch mode: watching ' + doc.Name)
+    return watcher
+
+def flush():
+    if watcher:
+        watcher.flush()
+
+# apply=False drops pending changes instead of applying them
+def stop(apply = True):
+    global watcher
+    if watcher is None:
+        return
+    App.removeDocumentObserver(watcher)
+    if watcher.timer:
+        watcher.timer.stop()
+    if apply:
+        watcher.flush()
+    else:
+        watcher.pending.clear()
+    watcher.writer.shutdown(wait=True)
+    print ('Watch mode: stopped')
+    watcher = None